@@ -1,10 +1,18 @@
 from dataclasses import dataclass
+from typing import Callable
+
+# progress(stage, done, total), e.g. ("embedding", 0, 1) or ("summarizing", 3, 7)
+ProgressCallback = Callable[[str, int, int], None]
+# on_theme(theme, summary): one finished theme, before the whole request completes
+ThemeCallback = Callable[[str, str], None]
 
 @dataclass
 class Message:
     user : str
     type : str
     text : str
+    id : int | None = None
+    weight : int = 1  # number of duplicate messages collapsed into this one
 
     def __len__(self):
         return len(self.text) + len(self.type) + len(self.user)
\ No newline at end of file
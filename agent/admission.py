@@ -0,0 +1,123 @@
+import asyncio
+import logging
+import math
+import os
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable
+
+logger = logging.getLogger(__name__)
+
+
+class QueueFull(Exception):
+    """Raised by AnalyzeExecutor.submit when all workers are busy and the queue is full."""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"analyze queue is full, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+_THREAD_ENV_VARS = ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS")
+
+
+def set_thread_env(threads: int) -> None:
+    """
+    Cap OpenMP/MKL/OpenBLAS pools via the environment. The libraries read these
+    variables once when they load, so this only works before numpy/torch are imported
+    (the server calls it first thing); explicitly set variables are kept.
+    """
+    if threads <= 0:
+        return
+    for name in _THREAD_ENV_VARS:
+        os.environ.setdefault(name, str(threads))
+
+
+def limit_torch_threads(threads: int) -> None:
+    """
+    Set torch's intra-op thread count. The setting is process-wide, not per worker:
+    all analyze workers share it, so the CPU budget is roughly
+    workers * threads (+ Ollama outside). Call once at startup, after torch is loaded.
+    """
+    if threads <= 0:
+        return
+    torch = sys.modules.get("torch")
+    if torch is not None and torch.get_num_threads() != threads:
+        torch.set_num_threads(threads)
+
+
+class AnalyzeExecutor:
+    """
+    Dedicated thread pool for /analyze pipelines with admission control.
+
+    At most `workers` pipelines run at once; up to `max_queue` more wait for a
+    worker. Anything beyond that is rejected with QueueFull instead of piling up
+    threads that would all fight for the same cores and the same Ollama.
+    """
+
+    def __init__(self, workers: int = 2, max_queue: int = 8, window: int = 200):
+        self.workers = max(1, int(workers))
+        self.max_queue = max(0, int(max_queue))
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="analyze")
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._running = 0
+        self._waits: deque[float] = deque(maxlen=window)
+        self._runs: deque[float] = deque(maxlen=window)
+        self.completed = 0
+        self.rejected = 0
+
+    def submit(self, fn: Callable[..., Any], *args: Any) -> asyncio.Future:
+        """Schedule `fn(*args)` on a worker; must be called from the event loop."""
+        with self._lock:
+            if self._queued + self._running >= self.workers + self.max_queue:
+                self.rejected += 1
+                raise QueueFull(self._retry_after())
+            self._queued += 1
+        enqueued = time.perf_counter()
+
+        def run() -> Any:
+            started = time.perf_counter()
+            with self._lock:
+                self._queued -= 1
+                self._running += 1
+                self._waits.append(started - enqueued)
+            try:
+                return fn(*args)
+            finally:
+                with self._lock:
+                    self._running -= 1
+                    self.completed += 1
+                    self._runs.append(time.perf_counter() - started)
+
+        return asyncio.wrap_future(self._executor.submit(run))
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            waits = list(self._waits)
+            return {
+                "workers": self.workers,
+                "running": self._running,
+                "queued": self._queued,
+                "max_queue": self.max_queue,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "avg_wait_seconds": round(sum(waits) / len(waits), 3) if waits else 0.0,
+                "max_wait_seconds": round(max(waits), 3) if waits else 0.0,
+                "avg_run_seconds": round(sum(self._runs) / len(self._runs), 3) if self._runs else None,
+            }
+
+    def retry_after(self) -> int:
+        with self._lock:
+            return self._retry_after()
+
+    def _retry_after(self) -> int:
+        """Seconds until a queue slot is likely free: one average run per worker wave ahead of us."""
+        avg_run = sum(self._runs) / len(self._runs) if self._runs else 30.0
+        waves = (self._queued + 1) / self.workers
+        return max(1, math.ceil(avg_run * waves))
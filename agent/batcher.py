@@ -0,0 +1,76 @@
+import asyncio
+import logging
+from concurrent.futures import Executor
+from typing import Callable
+
+logger = logging.getLogger(__name__)
+
+
+class MicroBatcher:
+    """
+    Coalesces concurrent `submit()` calls into one call of `fn(list_of_items)`.
+
+    A batch is flushed when it reaches `max_batch` items or `max_wait_ms` after its
+    first item arrived. `fn` is blocking and runs in `executor` (the loop's default
+    executor if None).
+    """
+
+    def __init__(
+            self,
+            fn: Callable[[list[str]], object],
+            max_batch: int = 64,
+            max_wait_ms: int = 50,
+            executor: Executor | None = None,
+    ):
+        self.fn = fn
+        self.executor = executor
+        self.max_batch = max(1, int(max_batch))
+        self.max_wait = max(0, int(max_wait_ms)) / 1000
+        self._pending: list[tuple[list[str], asyncio.Future]] = []
+        self._pending_size = 0
+        self._timer: asyncio.TimerHandle | None = None
+        self.batches = 0
+        self.items = 0
+
+    async def submit(self, items: list[str]) -> None:
+        if not items:
+            return
+        loop = asyncio.get_running_loop()
+        fut: asyncio.Future = loop.create_future()
+        self._pending.append((items, fut))
+        self._pending_size += len(items)
+
+        if self._pending_size >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._flush)
+
+        await fut
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        pending, self._pending = self._pending, []
+        self._pending_size = 0
+        if pending:
+            asyncio.get_running_loop().create_task(self._run(pending))
+
+    async def _run(self, pending: list[tuple[list[str], asyncio.Future]]) -> None:
+        items = [item for batch, _ in pending for item in batch]
+        try:
+            await asyncio.get_running_loop().run_in_executor(self.executor, self.fn, items)
+            self.batches += 1
+            self.items += len(items)
+        except Exception as exc:
+            logger.exception("Micro-batch of %s items failed: %s", len(items), exc)
+            for _, fut in pending:
+                if not fut.done():
+                    fut.set_exception(exc)
+            return
+        for _, fut in pending:
+            if not fut.done():
+                fut.set_result(None)
+
+    def stats(self) -> dict[str, int]:
+        return {"batches": self.batches, "items": self.items, "pending": self._pending_size}
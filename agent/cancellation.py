@@ -0,0 +1,38 @@
+import threading
+
+
+class Cancelled(Exception):
+    """Raised inside the pipeline once its CancellationToken has been cancelled."""
+
+
+class CancellationToken:
+    """
+    Cooperative cancellation flag shared by the request handler and the worker thread.
+
+    Nothing is interrupted mid-call: the pipeline calls `raise_if_cancelled()` between
+    stages, LLM chain invocations and graph steps, so at most the calls already in
+    flight are wasted.
+    """
+
+    def __init__(self):
+        self._event = threading.Event()
+        self.reason: str | None = None
+
+    def cancel(self, reason: str = "cancelled") -> None:
+        if not self._event.is_set():
+            self.reason = reason
+            self._event.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def raise_if_cancelled(self) -> None:
+        if self._event.is_set():
+            raise Cancelled(self.reason or "cancelled")
+
+
+def check(token: CancellationToken | None) -> None:
+    """`token.raise_if_cancelled()` for an optional token."""
+    if token is not None:
+        token.raise_if_cancelled()
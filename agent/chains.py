@@ -81,3 +81,43 @@ def build_update_chain(llm):
         ]
     )
     return prompt | llm | StrOutputParser()
+
+def build_fused_summary_chain(llm):
+    prompt = ChatPromptTemplate.from_messages(
+        [
+            (
+                "system",
+                "Ты суммаризируешь обсуждение одной темы на русском и придумываешь ему название. "
+                "Ответь ТОЛЬКО JSON-объектом без пояснений: "
+                '{{"title": "название темы 2–6 слов", "summary": ["буллет", "буллет"]}}. '
+                "В summary 3–12 коротких буллетов по делу, сохраняй технические детали. "
+                "Никаких придуманных фактов.",
+            ),
+            (
+                "human",
+                "Ключевые слова: {keywords}\n\nСообщения:\n<<<\n{chunk}\n>>>\n\nJSON:",
+            ),
+        ]
+    )
+    return prompt | llm | StrOutputParser()
+
+
+def build_fused_update_chain(llm):
+    prompt = ChatPromptTemplate.from_messages(
+        [
+            (
+                "system",
+                "Обнови саммари темы на русском, объединив предыдущее саммари и новое, и уточни название темы. "
+                "Ответь ТОЛЬКО JSON-объектом без пояснений: "
+                '{{"title": "название темы 2–6 слов", "summary": ["буллет", "буллет"]}}. '
+                "Убирай повторы, сохраняй ключевые факты, НЕ БОЛЕЕ 12 буллетов.",
+            ),
+            (
+                "human",
+                "Ключевые слова: {keywords}\nТема: {theme}\n\n"
+                "Предыдущее саммари:\n<<<\n{previous_summary}\n>>>\n\n"
+                "Новое саммари:\n<<<\n{summary}\n>>>\n\nJSON:",
+            ),
+        ]
+    )
+    return prompt | llm | StrOutputParser()
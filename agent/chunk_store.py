@@ -0,0 +1,62 @@
+import hashlib
+import threading
+
+from agent.llm_cache import CacheBackend
+
+
+class ChunkSummaryStore:
+    """
+    Persistent map of chunk identity -> partial summary.
+
+    Chunks are identified by their message-id range and content hash, so a chunk
+    that reappears in a later /analyze call (same checkpoint, more messages
+    appended) is not summarized again. Reduce outputs are stored the same way,
+    keyed by the exact set of partial summaries they were produced from.
+
+    Both prompts also contain the theme title and run at the builder's temperature,
+    so model, temperature and theme are part of every key: a chunk summarized under
+    one theme is not reused for another.
+    """
+
+    def __init__(self, backend: CacheBackend):
+        self.backend = backend
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(model: str, temperature: float, theme: str, kind: str, identity: str) -> str:
+        raw = f"{model}\n{temperature!r}\n{theme}\n{kind}\n{identity}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get_chunk(self, model: str, temperature: float, theme: str, chunk_key: str) -> str | None:
+        return self._get(self._key(model, temperature, theme, "chunk", chunk_key))
+
+    def set_chunk(self, model: str, temperature: float, theme: str, chunk_key: str, summary: str) -> None:
+        self.backend.set(self._key(model, temperature, theme, "chunk", chunk_key), summary)
+
+    def get_reduce(self, model: str, temperature: float, theme: str, parts: list[str]) -> str | None:
+        return self._get(self._key(model, temperature, theme, "reduce", _parts_digest(parts)))
+
+    def set_reduce(self, model: str, temperature: float, theme: str, parts: list[str], summary: str) -> None:
+        self.backend.set(self._key(model, temperature, theme, "reduce", _parts_digest(parts)), summary)
+
+    def stats(self) -> dict[str, int | str]:
+        return {"backend": type(self.backend).__name__, "hits": self.hits, "misses": self.misses}
+
+    def _get(self, key: str) -> str | None:
+        value = self.backend.get(key)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+
+def _parts_digest(parts: list[str]) -> str:
+    h = hashlib.sha256()
+    for part in parts:
+        h.update(part.encode("utf-8"))
+        h.update(b"\x00")
+    return h.hexdigest()
@@ -0,0 +1,113 @@
+import numpy as np
+
+CLUSTERING_BACKENDS = ("bertopic", "kmeans", "agglomerative")
+
+
+def cluster_embeddings(
+        embeddings: np.ndarray,
+        method: str,
+        min_topic_size: int,
+        max_k: int = 20,
+        distance_threshold: float = 0.35,
+        random_state: int = 42,
+) -> np.ndarray:
+    """
+    Cluster L2-normalized embeddings without UMAP/HDBSCAN.
+
+    - "kmeans": MiniBatchKMeans for every k in [2, min(max_k, n // min_topic_size)],
+      k picked by the best (sampled) silhouette score.
+    - "agglomerative": average-linkage on cosine distance cut at `distance_threshold`,
+      so the number of clusters follows from the data.
+
+    Clusters smaller than `min_topic_size` are relabeled -1 (noise), like HDBSCAN does.
+    Remaining labels are renumbered 0..k-1 by decreasing size.
+    """
+    from sklearn.cluster import AgglomerativeClustering, MiniBatchKMeans  # type: ignore
+    from sklearn.metrics import silhouette_score  # type: ignore
+
+    n = len(embeddings)
+    if n < 2:
+        return np.full(n, -1, dtype=int)
+
+    if method == "kmeans":
+        k_max = min(max_k, n // max(1, min_topic_size), n - 1)
+        if k_max < 2:
+            return np.full(n, -1, dtype=int)
+        sample_size = min(n, 1000)
+        best_score, labels = -np.inf, np.zeros(n, dtype=int)
+        for k in range(2, k_max + 1):
+            candidate = MiniBatchKMeans(
+                n_clusters=k,
+                random_state=random_state,
+                batch_size=256,
+                n_init=3,
+            ).fit_predict(embeddings)
+            if len(set(candidate)) < 2:
+                continue
+            score = silhouette_score(embeddings, candidate, sample_size=sample_size, random_state=random_state)
+            if score > best_score:
+                best_score, labels = score, candidate
+    elif method == "agglomerative":
+        labels = AgglomerativeClustering(
+            n_clusters=None,
+            metric="cosine",
+            linkage="average",
+            distance_threshold=distance_threshold,
+        ).fit_predict(embeddings)
+    else:
+        raise ValueError(f"Unknown clustering method: {method!r}")
+
+    return _relabel(labels, min_topic_size)
+
+
+def _relabel(labels: np.ndarray, min_topic_size: int) -> np.ndarray:
+    ids, counts = np.unique(labels, return_counts=True)
+    order = [i for i, c in sorted(zip(ids, counts), key=lambda x: -x[1]) if c >= min_topic_size]
+    mapping = {int(old): new for new, old in enumerate(order)}
+    return np.array([mapping.get(int(label), -1) for label in labels], dtype=int)
+
+
+def ctfidf_keywords(docs: list[str], labels: np.ndarray, top_n: int = 8) -> dict[int, list[str]]:
+    """
+    Class-based TF-IDF keywords per cluster (same weighting as BERTopic's c-TF-IDF).
+
+    All clusters are scored at once: per-class term counts are a sparse
+    (classes x docs) @ (docs x terms) product, then
+        w(t, c) = tf(t, c) * log(1 + A / f(t)),
+    where A is the average number of words per class and f(t) the frequency of t
+    over all classes. Noise (-1) is excluded.
+    """
+    from scipy import sparse  # type: ignore
+    from sklearn.feature_extraction.text import CountVectorizer  # type: ignore
+
+    topics = sorted(int(t) for t in set(labels.tolist()) if t != -1)
+    if not topics:
+        return {}
+
+    try:
+        counts = CountVectorizer().fit(docs)
+    except ValueError:  # empty vocabulary
+        return {t: [] for t in topics}
+    X = counts.transform(docs)
+    vocab = counts.get_feature_names_out()
+
+    row_of = {t: i for i, t in enumerate(topics)}
+    rows, cols = [], []
+    for doc_i, label in enumerate(labels):
+        if int(label) in row_of:
+            rows.append(row_of[int(label)])
+            cols.append(doc_i)
+    membership = sparse.csr_matrix((np.ones(len(rows)), (rows, cols)), shape=(len(topics), len(docs)))
+
+    tf = np.asarray((membership @ X).todense(), dtype=np.float64)
+    words_per_class = tf.sum(axis=1, keepdims=True)
+    avg_words = float(words_per_class.mean()) or 1.0
+    term_freq = tf.sum(axis=0)
+    idf = np.log(1.0 + avg_words / np.maximum(term_freq, 1.0))
+    weights = (tf / np.maximum(words_per_class, 1.0)) * idf
+
+    out: dict[int, list[str]] = {}
+    for t, row in zip(topics, weights):
+        top = np.argsort(-row)[:top_n]
+        out[t] = [str(vocab[i]) for i in top if row[i] > 0]
+    return out
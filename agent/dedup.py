@@ -0,0 +1,77 @@
+import re
+from difflib import SequenceMatcher
+from typing import Callable
+
+import numpy as np
+
+_WS_RE = re.compile(r"\s+")
+_EDGE_PUNCT = " \t.,!?;:…\"'«»()"
+
+
+def normalize_text(text: str) -> str:
+    """Case-fold, collapse whitespace and trim edge punctuation, so "+1", "+1!" and " +1 " collide."""
+    return _WS_RE.sub(" ", text.casefold()).strip(_EDGE_PUNCT) or text.strip()
+
+
+def exact_duplicate_units(messages) -> list[list[int]]:
+    """
+    Group indices of `messages` (anything with .user and .text) sent by the same user
+    with identical normalized text. A group is rendered as one line of its author, so
+    messages of different users are never grouped.
+
+    Returns groups in order of first occurrence; each group lists indices in input order.
+    """
+    groups: dict[tuple[str, str], list[int]] = {}
+    for i, m in enumerate(messages):
+        groups.setdefault((m.user, normalize_text(m.text)), []).append(i)
+    return list(groups.values())
+
+
+def near_duplicate_texts(a, b, min_ratio: float = 0.9) -> bool:
+    """
+    Whether messages `a` and `b` (anything with .user and .text) are the same
+    user's near-identical text. Guards embedding-based merging, which alone
+    treats short different replies ("в 5" / "в 6") as duplicates.
+    """
+    if a.user != b.user:
+        return False
+    left, right = normalize_text(a.text), normalize_text(b.text)
+    return left == right or SequenceMatcher(None, left, right).ratio() >= min_ratio
+
+
+def near_duplicate_leaders(
+        embeddings: np.ndarray,
+        threshold: float,
+        accept: Callable[[int, int], bool] | None = None,
+) -> list[int]:
+    """
+    Greedy leader clustering on L2-normalized rows.
+
+    Each row joins the most similar earlier leader with cosine similarity >= `threshold`
+    (and, if given, `accept(row, leader_row)`), otherwise it becomes a leader itself.
+    Returns the leader row index for every row. Cost is O(n * n_leaders), which is fine
+    for chat windows of a few thousand messages.
+    """
+    n = len(embeddings)
+    leaders = np.empty((n, embeddings.shape[1] if n else 0), dtype=np.float32)
+    leader_rows: list[int] = []
+    out: list[int] = []
+
+    for i in range(n):
+        leader = None
+        if leader_rows:
+            sims = leaders[:len(leader_rows)] @ embeddings[i]
+            for best in np.argsort(-sims):
+                if sims[best] < threshold:
+                    break
+                if accept is None or accept(i, leader_rows[best]):
+                    leader = leader_rows[best]
+                    break
+        if leader is not None:
+            out.append(leader)
+            continue
+        leaders[len(leader_rows)] = embeddings[i]
+        leader_rows.append(i)
+        out.append(i)
+
+    return out
@@ -1,14 +1,71 @@
+import numpy as np
+
+from agent.embedding_pool import EmbeddingProcessPool
+from agent.embedding_store import EmbeddingStore
+
+
 class E5Embedder:
-    def __init__(self, model_name: str = "intfloat/multilingual-e5-small", device: str = "cpu"):
+    backend = "torch"  # part of the embedding store key
+
+    def __init__(
+            self,
+            model_name: str = "intfloat/multilingual-e5-small",
+            device: str = "cpu",
+            store: EmbeddingStore | None = None,
+    ):
         from sentence_transformers import SentenceTransformer  # type: ignore
 
+        self.model_name = model_name
+        self.device = device
+        self.store = store
+        self.pool: EmbeddingProcessPool | None = None
         self._model = SentenceTransformer(model_name, device=device)
 
     def embed_documents(self, documents: list[str], verbose: bool = False) -> list[list[float]]:
+        if self.store is None or not documents:
+            return self._encode_batch(documents, verbose).tolist()
+
+        # only documents not seen before go through the transformer
+        cached = self.store.get_many(self.model_name, self.backend, documents)
+        missing = [i for i, v in enumerate(cached) if v is None]
+        if missing:
+            fresh = self._encode_batch([documents[i] for i in missing], verbose)
+            self.store.put_many(self.model_name, self.backend, [documents[i] for i in missing], fresh)
+            for i, vec in zip(missing, fresh):
+                cached[i] = vec
+        return np.stack(cached).tolist()
+
+    def encode_uncached(self, documents: list[str]) -> np.ndarray:
+        """Embed documents that are not chat messages, bypassing the embedding store."""
+        if not documents:
+            return np.zeros((0, self.dimension()), dtype=np.float32)
+        return self._encode_batch(documents)
+
+    def _encode_batch(self, documents: list[str], verbose: bool = False) -> np.ndarray:
+        """Large batches go to the process pool (if attached), small ones stay in-process."""
+        if self.pool is not None and len(documents) >= self.pool.threshold:
+            return self.pool.encode(documents, self.dimension())
+        return self._encode(documents, verbose)
+
+    def _encode(self, documents: list[str], verbose: bool = False) -> np.ndarray:
         prefixed = [f"passage: {d}" for d in documents]
-        embeddings = self._model.encode(
+        return self._model.encode(
             prefixed,
             show_progress_bar=verbose,
             normalize_embeddings=True,
-        )
-        return embeddings.tolist()
+            convert_to_numpy=True,
+        ).astype(np.float32, copy=False)
+
+    def dimension(self) -> int:
+        return int(self._model.get_sentence_embedding_dimension())
+
+    def warmup(self) -> None:
+        """Run one dummy encode so lazy kernels/allocations happen before the first request."""
+        self._encode(["warmup"])
+
+    def memory_bytes(self) -> int:
+        """Approximate size of model weights (parameters + buffers) in bytes."""
+        total = 0
+        for tensor in list(self._model.parameters()) + list(self._model.buffers()):
+            total += tensor.numel() * tensor.element_size()
+        return total
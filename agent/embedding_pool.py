@@ -0,0 +1,155 @@
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import Any
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# per-worker state, set by _init_worker in each child process
+_worker_embedder = None
+
+
+def _init_worker(model_name: str, device: str, backend: str, torch_threads: int) -> None:
+    """Load the model once per worker; pin intra-op threads before torch/ort start their pools."""
+    global _worker_embedder
+
+    threads = str(max(1, torch_threads))
+    os.environ["OMP_NUM_THREADS"] = threads
+    os.environ["MKL_NUM_THREADS"] = threads
+    os.environ["TOKENIZERS_PARALLELISM"] = "false"
+
+    if backend == "onnx":
+        os.environ["ONNX_NUM_THREADS"] = threads
+        from agent.onnx_embedder import OnnxE5Embedder
+
+        _worker_embedder = OnnxE5Embedder(model_name=model_name, device=device)
+    else:
+        import torch  # type: ignore
+
+        torch.set_num_threads(max(1, torch_threads))
+        from agent.embedder import E5Embedder
+
+        _worker_embedder = E5Embedder(model_name=model_name, device=device)
+    _worker_embedder.warmup()
+
+
+def _encode_into(shm_name: str, total: int, dim: int, start: int, documents: list[str]) -> int:
+    """Encode `documents` and write them into rows [start, start + len) of the shared buffer."""
+    vectors = _worker_embedder._encode(documents)
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        out = np.ndarray((total, dim), dtype=np.float32, buffer=shm.buf)
+        out[start:start + len(documents)] = vectors
+        del out
+    finally:
+        shm.close()
+    return len(documents)
+
+
+def _worker_ping() -> int:
+    return os.getpid()
+
+
+class EmbeddingProcessPool:
+    """
+    Process pool of embedding workers for large windows.
+
+    Every worker loads the model once (spawn context, so no torch state is forked)
+    and runs with `torch_threads` intra-op threads, so workers * torch_threads should
+    not exceed the cores given to the agent. A batch is split into one contiguous
+    shard per worker; workers write float32 vectors straight into a shared-memory
+    buffer, so only the texts are pickled, not the results.
+    """
+
+    def __init__(
+            self,
+            model_name: str,
+            device: str = "cpu",
+            backend: str = "torch",
+            workers: int = 2,
+            threshold: int = 256,
+            torch_threads: int = 1,
+    ):
+        self.model_name = model_name
+        self.device = device
+        self.backend = backend
+        self.workers = max(1, int(workers))
+        self.threshold = max(1, int(threshold))
+        self.torch_threads = max(1, int(torch_threads))
+        self._executor: ProcessPoolExecutor | None = None
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.documents = 0
+        self.seconds = 0.0
+
+    def start(self) -> None:
+        """Spawn workers and wait until each has loaded the model."""
+        with self._lock:
+            if self._executor is not None:
+                return
+            logger.info(
+                "Starting embedding pool model=%s workers=%s torch_threads=%s",
+                self.model_name,
+                self.workers,
+                self.torch_threads,
+            )
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(self.model_name, self.device, self.backend, self.torch_threads),
+            )
+            # workers are spawned lazily; force all of them up so the first request does not pay for it
+            for fut in [self._executor.submit(_worker_ping) for _ in range(self.workers)]:
+                fut.result()
+
+    def encode(self, documents: list[str], dim: int) -> np.ndarray:
+        """Encode raw documents across workers; returns a (len(documents), dim) float32 array."""
+        self.start()
+        n = len(documents)
+        if n == 0:
+            return np.zeros((0, dim), dtype=np.float32)
+
+        started = time.perf_counter()
+        shard = -(-n // self.workers)
+        shm = shared_memory.SharedMemory(create=True, size=max(1, n * dim * 4))
+        try:
+            futures = [
+                self._executor.submit(_encode_into, shm.name, n, dim, start, documents[start:start + shard])
+                for start in range(0, n, shard)
+            ]
+            for fut in futures:
+                fut.result()
+            out = np.ndarray((n, dim), dtype=np.float32, buffer=shm.buf).copy()
+        finally:
+            shm.close()
+            shm.unlink()
+
+        with self._lock:
+            self.batches += 1
+            self.documents += n
+            self.seconds += time.perf_counter() - started
+        return out
+
+    def close(self) -> None:
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True, cancel_futures=True)
+                self._executor = None
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "workers": self.workers,
+            "torch_threads": self.torch_threads,
+            "threshold": self.threshold,
+            "running": self._executor is not None,
+            "batches": self.batches,
+            "documents": self.documents,
+            "seconds": round(self.seconds, 3),
+        }
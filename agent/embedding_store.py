@@ -0,0 +1,114 @@
+import hashlib
+import logging
+import sqlite3
+import threading
+import time
+from typing import Any
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+_SQLITE_MAX_VARS = 500
+
+
+class EmbeddingStore:
+    """
+    SQLite store of document embeddings keyed by sha256(model name, backend, document text).
+
+    The backend is part of the key because vectors of the same model differ between
+    backends (e.g. int8 ONNX vs fp32 torch) and must not be mixed in one clustering run.
+
+    Vectors are stored as float32 blobs. Rows not read or written for `ttl_seconds`
+    are evicted (default 24h, the same retention as messages in the bot DB, so an
+    embedding lives as long as the message it belongs to can still be summarized).
+    """
+
+    def __init__(
+            self,
+            path: str,
+            table: str = "embeddings",
+            ttl_seconds: int | None = 24 * 3600,
+            evict_every: int = 50,
+    ):
+        self.table = table
+        self.ttl_seconds = ttl_seconds or None
+        self.evict_every = max(1, int(evict_every))
+        self._writes = 0
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            f"""
+            CREATE TABLE IF NOT EXISTS {table} (
+                key TEXT PRIMARY KEY,
+                dim INTEGER NOT NULL,
+                vector BLOB NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_accessed ON {table}(accessed_at)")
+        self._conn.commit()
+
+    @staticmethod
+    def key(model: str, backend: str, text: str) -> str:
+        return hashlib.sha256(f"{model}\n{backend}\n{text}".encode("utf-8")).hexdigest()
+
+    def get_many(self, model: str, backend: str, texts: list[str]) -> list[np.ndarray | None]:
+        keys = [self.key(model, backend, t) for t in texts]
+        found: dict[str, np.ndarray] = {}
+        now = time.time()
+
+        with self._lock:
+            for start in range(0, len(keys), _SQLITE_MAX_VARS):
+                batch = keys[start:start + _SQLITE_MAX_VARS]
+                marks = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM {self.table} WHERE key IN ({marks})",
+                    batch,
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float32)
+                if rows:
+                    self._conn.execute(
+                        f"UPDATE {self.table} SET accessed_at=? WHERE key IN ({','.join('?' * len(rows))})",
+                        [now, *[k for k, _ in rows]],
+                    )
+            self._conn.commit()
+            self.hits += sum(1 for k in keys if k in found)
+            self.misses += sum(1 for k in keys if k not in found)
+
+        return [found.get(k) for k in keys]
+
+    def put_many(self, model: str, backend: str, texts: list[str], vectors: np.ndarray) -> None:
+        now = time.time()
+        rows = [
+            (self.key(model, backend, t), int(v.shape[0]), np.asarray(v, dtype=np.float32).tobytes(), now)
+            for t, v in zip(texts, vectors)
+        ]
+        with self._lock:
+            self._conn.executemany(
+                f"""
+                INSERT INTO {self.table} (key, dim, vector, accessed_at) VALUES (?, ?, ?, ?)
+                ON CONFLICT(key) DO UPDATE SET vector=excluded.vector, dim=excluded.dim,
+                    accessed_at=excluded.accessed_at
+                """,
+                rows,
+            )
+            self._writes += 1
+            if self.ttl_seconds and self._writes % self.evict_every == 0:
+                deleted = self._conn.execute(
+                    f"DELETE FROM {self.table} WHERE accessed_at < ?",
+                    (now - self.ttl_seconds,),
+                ).rowcount
+                if deleted:
+                    logger.info("Evicted %s stale embeddings", deleted)
+            self._conn.commit()
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            size = self._conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+            return {"size": size, "hits": self.hits, "misses": self.misses}
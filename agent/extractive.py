@@ -0,0 +1,59 @@
+from typing import Callable
+
+import numpy as np
+
+from agent import Message
+from agent.summarizer import _message_line, _token_sizes
+
+
+def select_representative(
+        messages: list[Message],
+        embeddings: np.ndarray,
+        token_count: Callable[[str], int],
+        budget_tokens: int,
+        mmr_lambda: float = 0.5,
+) -> list[Message]:
+    """
+    Pick a subset of `messages` that fits into `budget_tokens` using MMR.
+
+    Relevance is cosine similarity to the topic centroid; redundancy is the highest
+    similarity to an already selected message. Score = λ·relevance − (1−λ)·redundancy.
+    Messages that no longer fit the remaining budget are skipped.
+
+    `embeddings` must be L2-normalized and aligned with `messages`.
+    Returns the selected messages in their original (chronological) order;
+    returns `messages` unchanged if they already fit.
+    """
+    rendered = [(i, ln) for i, ln in enumerate(_message_line(m) for m in messages) if ln]
+    if not rendered:
+        return []
+
+    idx = np.array([i for i, _ in rendered])
+    sizes = np.array(_token_sizes([ln for _, ln in rendered], token_count))
+    if sizes.sum() <= budget_tokens:
+        return [messages[i] for i in idx]
+
+    vecs = embeddings[idx]
+    centroid = vecs.mean(axis=0)
+    centroid /= np.linalg.norm(centroid) or 1.0
+    relevance = vecs @ centroid
+
+    redundancy = np.full(len(idx), -1.0, dtype=np.float32)
+    available = np.ones(len(idx), dtype=bool)
+    remaining = int(budget_tokens)
+    selected: list[int] = []
+
+    while True:
+        available &= sizes <= remaining
+        if not available.any():
+            break
+        score = mmr_lambda * relevance - (1.0 - mmr_lambda) * np.maximum(redundancy, 0.0)
+        score[~available] = -np.inf
+        best = int(np.argmax(score))
+
+        selected.append(best)
+        available[best] = False
+        remaining -= int(sizes[best])
+        redundancy = np.maximum(redundancy, vecs @ vecs[best])
+
+    return [messages[idx[j]] for j in sorted(selected)]
@@ -0,0 +1,144 @@
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any
+
+from agent.cancellation import CancellationToken
+
+
+class JobStoreFull(Exception):
+    """Raised by JobStore.create when every retained job is still queued or running."""
+
+
+@dataclass
+class Job:
+    """One asynchronous /analyze run and its stage-level progress."""
+    id: str
+    status: str = "queued"  # queued | running | done | failed | cancelled
+    stage: str = "queued"
+    done: int = 0
+    total: int = 0
+    result: Any = None
+    error: str | None = None
+    status_code: int | None = None
+    session_version: int | None = None
+    created_at: float = field(default_factory=time.time)
+    started_at: float | None = None
+    finished_at: float | None = None
+    cancel: CancellationToken = field(default_factory=CancellationToken, repr=False)
+
+    def to_dict(self) -> dict[str, Any]:
+        out = {
+            "id": self.id,
+            "status": self.status,
+            "stage": self.stage,
+            "done": self.done,
+            "total": self.total,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+        if self.status == "done":
+            out["result"] = self.result
+            out["session_version"] = self.session_version
+        if self.status in ("failed", "cancelled"):
+            out["error"] = self.error
+            out["status_code"] = self.status_code
+        if self.status in ("queued", "running") and self.cancel.cancelled:
+            out["cancelling"] = True
+        return out
+
+
+class JobStore:
+    """
+    In-memory jobs of this agent process.
+
+    Finished jobs are kept for `ttl_seconds` so the client can fetch the result;
+    at most `max_jobs` are retained. Only finished jobs are dropped to make room
+    (oldest first): a queued or running job stays pollable until it ends.
+    """
+
+    def __init__(self, ttl_seconds: int = 3600, max_jobs: int = 1000):
+        self.ttl_seconds = int(ttl_seconds)
+        self.max_jobs = max(1, int(max_jobs))
+        self._lock = threading.Lock()
+        self._jobs: OrderedDict[str, Job] = OrderedDict()
+
+    def create(self) -> Job:
+        job = Job(id=uuid.uuid4().hex)
+        with self._lock:
+            self._purge()
+            if len(self._jobs) >= self.max_jobs:
+                finished = [job_id for job_id, j in self._jobs.items() if j.finished_at is not None]
+                if len(self._jobs) - len(finished) >= self.max_jobs:
+                    raise JobStoreFull(f"{len(self._jobs)} jobs are still queued or running")
+                for job_id in finished[:len(self._jobs) - self.max_jobs + 1]:
+                    del self._jobs[job_id]
+            self._jobs[job.id] = job
+        return job
+
+    def get(self, job_id: str) -> Job | None:
+        with self._lock:
+            self._purge()
+            return self._jobs.get(job_id)
+
+    def discard(self, job_id: str) -> None:
+        with self._lock:
+            self._jobs.pop(job_id, None)
+
+    def start(self, job: Job) -> None:
+        with self._lock:
+            job.status = "running"
+            job.started_at = time.time()
+
+    def progress(self, job: Job, stage: str, done: int, total: int) -> None:
+        with self._lock:
+            job.stage = stage
+            job.done = int(done)
+            job.total = int(total)
+
+    def finish(self, job: Job, result: Any, session_version: int | None = None) -> None:
+        with self._lock:
+            job.status = "done"
+            job.stage = "done"
+            job.result = result
+            job.session_version = session_version
+            job.finished_at = time.time()
+
+    def fail(self, job: Job, error: str, status_code: int = 500) -> None:
+        with self._lock:
+            job.status = "failed"
+            job.error = error
+            job.status_code = status_code
+            job.finished_at = time.time()
+
+    def cancel(self, job: Job, reason: str = "cancelled by client") -> None:
+        """Ask a queued/running job to stop; it turns "cancelled" at its next check."""
+        if job.finished_at is None:
+            job.cancel.cancel(reason)
+
+    def cancelled(self, job: Job) -> None:
+        with self._lock:
+            job.status = "cancelled"
+            job.error = job.cancel.reason
+            job.status_code = 499
+            job.finished_at = time.time()
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            counts: dict[str, int] = {}
+            for job in self._jobs.values():
+                counts[job.status] = counts.get(job.status, 0) + 1
+            return {"size": len(self._jobs), "ttl_seconds": self.ttl_seconds, **counts}
+
+    def _purge(self) -> None:
+        now = time.time()
+        expired = [
+            job_id
+            for job_id, job in self._jobs.items()
+            if job.finished_at is not None and now - job.finished_at > self.ttl_seconds
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
@@ -0,0 +1,275 @@
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Protocol
+
+logger = logging.getLogger(__name__)
+
+
+class CacheBackend(Protocol):
+    def get(self, key: str) -> str | None: ...
+
+    def set(self, key: str, value: str) -> None: ...
+
+
+class MemoryCache:
+    """In-process LRU with optional TTL. Thread-safe."""
+
+    def __init__(self, max_entries: int = 10000, ttl_seconds: int | None = None):
+        self.max_entries = max(1, int(max_entries))
+        self.ttl_seconds = ttl_seconds or None
+        self._lock = threading.Lock()
+        self._items: OrderedDict[str, tuple[str, float | None]] = OrderedDict()
+
+    def get(self, key: str) -> str | None:
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                return None
+            value, expires_at = item
+            if expires_at is not None and expires_at < time.time():
+                del self._items[key]
+                return None
+            self._items.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: str) -> None:
+        expires_at = time.time() + self.ttl_seconds if self.ttl_seconds else None
+        with self._lock:
+            self._items[key] = (value, expires_at)
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_entries:
+                self._items.popitem(last=False)
+
+
+class SQLiteCache:
+    """
+    On-disk cache in a single SQLite table.
+
+    Expired rows are skipped on read; TTL and size eviction run on every
+    `evict_every` writes and drop the least recently used rows.
+    """
+
+    def __init__(
+            self,
+            path: str,
+            table: str = "llm_cache",
+            max_entries: int = 100000,
+            ttl_seconds: int | None = None,
+            evict_every: int = 100,
+    ):
+        self.table = table
+        self.max_entries = max(1, int(max_entries))
+        self.ttl_seconds = ttl_seconds or None
+        self.evict_every = max(1, int(evict_every))
+        self._writes = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            f"""
+            CREATE TABLE IF NOT EXISTS {table} (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_accessed ON {table}(accessed_at)")
+        self._conn.commit()
+
+    def get(self, key: str) -> str | None:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(f"SELECT value, created_at FROM {self.table} WHERE key=?", (key,)).fetchone()
+            if row is None:
+                return None
+            value, created_at = row
+            if self.ttl_seconds and created_at + self.ttl_seconds < now:
+                self._conn.execute(f"DELETE FROM {self.table} WHERE key=?", (key,))
+                self._conn.commit()
+                return None
+            self._conn.execute(f"UPDATE {self.table} SET accessed_at=? WHERE key=?", (now, key))
+            self._conn.commit()
+            return value
+
+    def set(self, key: str, value: str) -> None:
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                f"""
+                INSERT INTO {self.table} (key, value, created_at, accessed_at) VALUES (?, ?, ?, ?)
+                ON CONFLICT(key) DO UPDATE SET value=excluded.value, created_at=excluded.created_at,
+                    accessed_at=excluded.accessed_at
+                """,
+                (key, value, now, now),
+            )
+            self._writes += 1
+            if self._writes % self.evict_every == 0:
+                self._evict(now)
+            self._conn.commit()
+
+    def _evict(self, now: float) -> None:
+        if self.ttl_seconds:
+            self._conn.execute(f"DELETE FROM {self.table} WHERE created_at < ?", (now - self.ttl_seconds,))
+        self._conn.execute(
+            f"""
+            DELETE FROM {self.table} WHERE key IN (
+                SELECT key FROM {self.table} ORDER BY accessed_at DESC LIMIT -1 OFFSET ?
+            )
+            """,
+            (self.max_entries,),
+        )
+
+
+class RedisCache:
+    """
+    Cache stored in Redis as plain string keys with TTL.
+
+    Size eviction is delegated to the Redis `maxmemory-policy` (e.g. allkeys-lru).
+    """
+
+    def __init__(self, url: str, prefix: str = "llm_cache:", ttl_seconds: int | None = None):
+        from redis import Redis  # type: ignore
+
+        self.prefix = prefix
+        self.ttl_seconds = ttl_seconds or None
+        self._redis = Redis.from_url(url, decode_responses=True)
+
+    def get(self, key: str) -> str | None:
+        try:
+            return self._redis.get(self.prefix + key)
+        except Exception as exc:
+            logger.warning("Redis cache get failed: %s", exc)
+            return None
+
+    def set(self, key: str, value: str) -> None:
+        try:
+            self._redis.set(self.prefix + key, value, ex=self.ttl_seconds)
+        except Exception as exc:
+            logger.warning("Redis cache set failed: %s", exc)
+
+
+def build_cache_backend(
+        kind: str,
+        max_entries: int = 10000,
+        ttl_seconds: int | None = None,
+        sqlite_path: str | None = None,
+        redis_url: str | None = None,
+        namespace: str = "llm_cache",
+) -> CacheBackend | None:
+    """
+    Build a cache backend by name: "memory", "sqlite", "redis" or "off".
+
+    `namespace` separates independent caches sharing one SQLite file or Redis instance.
+    Falls back to the in-memory backend if the requested one cannot be initialized.
+    """
+    kind = (kind or "off").strip().lower()
+    if kind in ("", "off", "none", "0", "false"):
+        return None
+    try:
+        if kind == "sqlite":
+            return SQLiteCache(sqlite_path or "agent_cache.sqlite3", table=namespace,
+                               max_entries=max_entries, ttl_seconds=ttl_seconds)
+        if kind == "redis":
+            if not redis_url:
+                raise ValueError("REDIS_URL is not set")
+            return RedisCache(redis_url, prefix=f"{namespace}:", ttl_seconds=ttl_seconds)
+    except Exception as exc:
+        logger.warning("Cache backend %s unavailable for %s, falling back to memory: %s", kind, namespace, exc)
+    return MemoryCache(max_entries=max_entries, ttl_seconds=ttl_seconds)
+
+
+def _prompt_fingerprint(chain: Any) -> str:
+    prompt = getattr(chain, "first", None)
+    try:
+        return prompt.pretty_repr() if prompt is not None else repr(chain)
+    except Exception:
+        return repr(prompt)
+
+
+class LLMCache:
+    """
+    Content-addressed cache of chain outputs with per-chain hit/miss counters.
+
+    Key: sha256 of (model, temperature, prompt template, inputs).
+    """
+
+    def __init__(self, backend: CacheBackend):
+        self.backend = backend
+        self._lock = threading.Lock()
+        self._counters: dict[str, dict[str, int]] = {}
+
+    def wrap(self, name: str, chain: Any, model: str, temperature: float) -> "CachedChain":
+        return CachedChain(self, name, chain, model, temperature)
+
+    def key(self, model: str, temperature: float, template: str, inputs: dict[str, Any]) -> str:
+        payload = json.dumps(
+            {"model": model, "temperature": temperature, "template": template, "inputs": inputs},
+            sort_keys=True,
+            ensure_ascii=False,
+            default=str,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def record(self, name: str, hits: int = 0, misses: int = 0) -> None:
+        with self._lock:
+            counters = self._counters.setdefault(name, {"hits": 0, "misses": 0})
+            counters["hits"] += hits
+            counters["misses"] += misses
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            chains = {name: dict(c) for name, c in self._counters.items()}
+        return {
+            "backend": type(self.backend).__name__,
+            "hits": sum(c["hits"] for c in chains.values()),
+            "misses": sum(c["misses"] for c in chains.values()),
+            "chains": chains,
+        }
+
+
+class CachedChain:
+    """Drop-in wrapper for a `prompt | llm | parser` chain exposing `invoke` and `batch`."""
+
+    def __init__(self, cache: LLMCache, name: str, chain: Any, model: str, temperature: float):
+        self.cache = cache
+        self.name = name
+        self.chain = chain
+        self.model = model
+        self.temperature = float(temperature)
+        self._template = _prompt_fingerprint(chain)
+
+    def _key(self, inputs: dict[str, Any]) -> str:
+        return self.cache.key(self.model, self.temperature, self._template, inputs)
+
+    def invoke(self, inputs: dict[str, Any], config: Any = None) -> str:
+        key = self._key(inputs)
+        cached = self.cache.backend.get(key)
+        if cached is not None:
+            self.cache.record(self.name, hits=1)
+            return cached
+
+        self.cache.record(self.name, misses=1)
+        result = self.chain.invoke(inputs, config=config)
+        self.cache.backend.set(key, result)
+        return result
+
+    def batch(self, inputs: list[dict[str, Any]], config: Any = None) -> list[str]:
+        keys = [self._key(i) for i in inputs]
+        results: list[str | None] = [self.cache.backend.get(k) for k in keys]
+        missing = [i for i, r in enumerate(results) if r is None]
+        self.cache.record(self.name, hits=len(inputs) - len(missing), misses=len(missing))
+
+        if missing:
+            fresh = self.chain.batch([inputs[i] for i in missing], config=config)
+            for i, value in zip(missing, fresh):
+                results[i] = value
+                self.cache.backend.set(keys[i], value)
+
+        return results  # type: ignore[return-value]
@@ -0,0 +1,153 @@
+import inspect
+import logging
+import os
+from pathlib import Path
+
+import numpy as np
+
+from agent.embedder import E5Embedder
+from agent.embedding_store import EmbeddingStore
+
+logger = logging.getLogger(__name__)
+
+ONNX_CACHE_DIR = os.getenv("ONNX_CACHE_DIR", "onnx_models")
+ONNX_NUM_THREADS = int(os.getenv("ONNX_NUM_THREADS", "0"))
+ONNX_LOCAL_FILES_ONLY = os.getenv("ONNX_LOCAL_FILES_ONLY", "false").strip().lower() in {"1", "true", "yes", "y", "on"}
+
+
+def _export_onnx(model_name: str, tokenizer, target: Path) -> None:
+    """Export the transformer encoder (last_hidden_state) to ONNX with dynamic batch/sequence axes."""
+    import torch  # type: ignore
+    from transformers import AutoModel  # type: ignore
+
+    model = AutoModel.from_pretrained(model_name, local_files_only=ONNX_LOCAL_FILES_ONLY)
+    model.eval()
+
+    class _Encoder(torch.nn.Module):
+        # passes inputs by name: positional order of forward() differs between transformers versions
+        def __init__(self):
+            super().__init__()
+            self.model = model
+
+        def forward(self, *inputs):
+            return self.model(**dict(zip(input_names, inputs))).last_hidden_state
+
+    sample = tokenizer(["passage: warmup"], return_tensors="pt")
+    input_names = [n for n in ("input_ids", "attention_mask", "token_type_ids") if n in sample]
+    dynamic = {n: {0: "batch", 1: "sequence"} for n in input_names}
+    dynamic["last_hidden_state"] = {0: "batch", 1: "sequence"}
+
+    # newer torch defaults to the dynamo exporter (needs onnxscript); the TorchScript one is enough here
+    extra = {"dynamo": False} if "dynamo" in inspect.signature(torch.onnx.export).parameters else {}
+
+    target.parent.mkdir(parents=True, exist_ok=True)
+    with torch.no_grad():
+        torch.onnx.export(
+            _Encoder(),
+            tuple(sample[n] for n in input_names),
+            str(target),
+            input_names=input_names,
+            output_names=["last_hidden_state"],
+            dynamic_axes=dynamic,
+            opset_version=14,
+            **extra,
+        )
+
+
+class OnnxE5Embedder(E5Embedder):
+    """
+    E5 on ONNX Runtime (CPU) with int8 dynamic quantization.
+
+    The model is exported once from the local Hugging Face files into ONNX_CACHE_DIR
+    and quantized next to it. Inference uses mean pooling + L2 normalization, like the
+    sentence-transformers pipeline of multilingual-e5. Documents are sorted by token
+    length and batched, so each batch pads only to its own longest document.
+    """
+
+    def __init__(
+            self,
+            model_name: str = "intfloat/multilingual-e5-small",
+            device: str = "cpu",
+            store: EmbeddingStore | None = None,
+            quantize: bool = True,
+            batch_size: int = 32,
+            max_length: int = 512,
+    ):
+        import onnxruntime as ort  # type: ignore
+        from transformers import AutoTokenizer  # type: ignore
+
+        self.model_name = model_name
+        self.device = device
+        self.store = store
+        self.pool = None
+        self.backend = "onnx-int8" if quantize else "onnx"
+        self.batch_size = max(1, int(batch_size))
+        self.max_length = int(max_length)
+
+        self._tokenizer = AutoTokenizer.from_pretrained(model_name, local_files_only=ONNX_LOCAL_FILES_ONLY)
+
+        base = Path(ONNX_CACHE_DIR) / model_name.replace("/", "__")
+        fp32_path = base / "model.onnx"
+        if not fp32_path.exists():
+            logger.info("Exporting %s to ONNX at %s", model_name, fp32_path)
+            _export_onnx(model_name, self._tokenizer, fp32_path)
+
+        model_path = fp32_path
+        if quantize:
+            model_path = base / "model.int8.onnx"
+            if not model_path.exists():
+                from onnxruntime.quantization import QuantType, quantize_dynamic  # type: ignore
+
+                logger.info("Quantizing %s to int8 at %s", model_name, model_path)
+                quantize_dynamic(str(fp32_path), str(model_path), weight_type=QuantType.QInt8)
+
+        options = ort.SessionOptions()
+        if ONNX_NUM_THREADS > 0:
+            options.intra_op_num_threads = ONNX_NUM_THREADS
+        self._session = ort.InferenceSession(str(model_path), options, providers=["CPUExecutionProvider"])
+        self._input_names = {i.name for i in self._session.get_inputs()}
+        self._dimension = int(self._session.get_outputs()[0].shape[-1])
+        self._model_path = model_path
+
+    def _encode(self, documents: list[str], verbose: bool = False) -> np.ndarray:
+        prefixed = [f"passage: {d}" for d in documents]
+        if not prefixed:
+            return np.zeros((0, 0), dtype=np.float32)
+
+        lengths = [
+            len(ids)
+            for ids in self._tokenizer(prefixed, truncation=True, max_length=self.max_length)["input_ids"]
+        ]
+        order = np.argsort(lengths, kind="stable")
+
+        out: np.ndarray | None = None
+        for start in range(0, len(order), self.batch_size):
+            idx = order[start:start + self.batch_size]
+            enc = self._tokenizer(
+                [prefixed[i] for i in idx],
+                padding=True,
+                truncation=True,
+                max_length=self.max_length,
+                return_tensors="np",
+            )
+            feeds = {k: v.astype(np.int64) for k, v in enc.items() if k in self._input_names}
+            hidden = self._session.run(["last_hidden_state"], feeds)[0]
+
+            mask = enc["attention_mask"][..., None].astype(np.float32)
+            pooled = (hidden * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+            pooled /= np.maximum(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12)
+
+            if out is None:
+                out = np.empty((len(prefixed), pooled.shape[1]), dtype=np.float32)
+            out[idx] = pooled
+        return out
+
+    def dimension(self) -> int:
+        return self._dimension
+
+    def memory_bytes(self) -> int:
+        """Size of the ONNX model file in bytes (weights dominate the in-memory footprint)."""
+        try:
+            return self._model_path.stat().st_size
+        except OSError:
+            return 0
@@ -0,0 +1,95 @@
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any
+
+from agent.chunk_store import ChunkSummaryStore
+from agent.llm_cache import LLMCache
+from agent.summarizer import SummaryBuilder
+from agent.title_memo import ThemeTitleMemo
+
+logger = logging.getLogger(__name__)
+
+
+class SummaryBuilderPool:
+    """
+    Bounded LRU cache of ready SummaryBuilder instances.
+
+    Key: (model, context_window_tokens, temperature, base_url, sorted builder options).
+    A SummaryBuilder holds no per-call state, so one instance is shared by concurrent
+    requests; this skips rebuilding ChatOllama, the chains and the compiled graph and
+    keeps the Ollama client alive between requests.
+    """
+
+    def __init__(
+            self,
+            max_size: int = 4,
+            llm_cache: LLMCache | None = None,
+            chunk_store: ChunkSummaryStore | None = None,
+            title_memo: ThemeTitleMemo | None = None,
+    ):
+        self.max_size = max(1, int(max_size))
+        self.llm_cache = llm_cache
+        self.chunk_store = chunk_store
+        self.title_memo = title_memo
+        self._lock = threading.Lock()
+        self._builders: OrderedDict[tuple, SummaryBuilder] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(
+            self,
+            model: str,
+            context_window_tokens: int,
+            temperature: float = 0.5,
+            base_url: str | None = None,
+            **options: Any,
+    ) -> SummaryBuilder:
+        """
+        Return a cached builder for the given settings, building it on a miss.
+
+        `options` are passed through to SummaryBuilder (map_concurrency, reduce_mode, ...)
+        and are part of the cache key.
+        """
+        key = (model, int(context_window_tokens), float(temperature), base_url, tuple(sorted(options.items())))
+
+        with self._lock:
+            builder = self._builders.get(key)
+            if builder is not None:
+                self._builders.move_to_end(key)
+                self.hits += 1
+                return builder
+            self.misses += 1
+
+        logger.info("Building SummaryBuilder model=%s window=%s temperature=%s", model, context_window_tokens, temperature)
+        builder = SummaryBuilder(
+            model=model,
+            base_url=base_url,
+            context_window_tokens=context_window_tokens,
+            temperature=temperature,
+            llm_cache=self.llm_cache,
+            chunk_store=self.chunk_store,
+            title_memo=self.title_memo,
+            **options,
+        )
+
+        with self._lock:
+            # another thread may have built the same key meanwhile; keep the first one
+            existing = self._builders.get(key)
+            if existing is not None:
+                self._builders.move_to_end(key)
+                return existing
+            self._builders[key] = builder
+            while len(self._builders) > self.max_size:
+                evicted, _ = self._builders.popitem(last=False)
+                logger.info("Evicted SummaryBuilder key=%s", evicted)
+        return builder
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            return {
+                "size": len(self._builders),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
@@ -0,0 +1,167 @@
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any
+
+from agent.embedder import E5Embedder
+from agent.embedding_pool import EmbeddingProcessPool
+from agent.embedding_store import EmbeddingStore
+
+logger = logging.getLogger(__name__)
+
+
+EMBEDDING_BACKENDS = ("torch", "onnx")
+
+
+@dataclass
+class LoadedModel:
+    model_name: str
+    device: str
+    backend: str
+    model: Any
+    load_seconds: float
+    warmup_seconds: float
+    memory_bytes: int
+    loaded_at: float
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "model": self.model_name,
+            "device": self.device,
+            "backend": self.backend,
+            "load_seconds": round(self.load_seconds, 3),
+            "warmup_seconds": round(self.warmup_seconds, 3),
+            "memory_bytes": self.memory_bytes,
+            "loaded_at": self.loaded_at,
+        }
+
+
+def _process_rss_bytes() -> int | None:
+    """Current resident set size of this process (Linux only), None if unavailable."""
+    try:
+        with open("/proc/self/statm", "r", encoding="ascii") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class ModelRegistry:
+    """
+    Process-wide registry of loaded embedding models keyed by (model_name, device, backend).
+
+    Each model is loaded and warmed up exactly once; all requests share the same instance.
+    `backend` is "torch" (sentence-transformers) or "onnx" (int8 ONNX Runtime).
+    With `pool_workers` > 0 every embedder also gets a process pool that takes
+    batches of at least `pool_threshold` documents.
+    """
+
+    def __init__(
+            self,
+            backend: str = "torch",
+            pool_workers: int = 0,
+            pool_threshold: int = 256,
+            pool_torch_threads: int = 1,
+    ):
+        if backend not in EMBEDDING_BACKENDS:
+            raise ValueError(f"Unknown embedding backend: {backend!r}")
+        self.backend = backend
+        self.pool_workers = max(0, int(pool_workers))
+        self.pool_threshold = pool_threshold
+        self.pool_torch_threads = pool_torch_threads
+        self._lock = threading.Lock()
+        self._models: dict[tuple[str, str, str], LoadedModel] = {}
+        self.embedding_store: EmbeddingStore | None = None
+
+    def set_embedding_store(self, store: EmbeddingStore | None) -> None:
+        """Attach a persistent embedding store to all current and future embedders."""
+        with self._lock:
+            self.embedding_store = store
+            for loaded in self._models.values():
+                loaded.model.store = store
+
+    def get_embedder(self, model_name: str, device: str = "cpu", backend: str | None = None) -> E5Embedder:
+        backend = backend or self.backend
+        key = (model_name, device, backend)
+        loaded = self._models.get(key)
+        if loaded is not None:
+            return loaded.model
+
+        with self._lock:
+            loaded = self._models.get(key)
+            if loaded is None:
+                loaded = self._load_embedder(model_name, device, backend, self.embedding_store)
+                if self.pool_workers > 0:
+                    loaded.model.pool = EmbeddingProcessPool(
+                        model_name,
+                        device=device,
+                        backend=backend,
+                        workers=self.pool_workers,
+                        threshold=self.pool_threshold,
+                        torch_threads=self.pool_torch_threads,
+                    )
+                    loaded.model.pool.start()
+                self._models[key] = loaded
+        return loaded.model
+
+    def close(self) -> None:
+        """Stop embedding worker processes."""
+        with self._lock:
+            for loaded in self._models.values():
+                if loaded.model.pool is not None:
+                    loaded.model.pool.close()
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "models": [m.stats() for m in self._models.values()],
+            "embedding_pools": [m.model.pool.stats() for m in self._models.values() if m.model.pool is not None],
+            "rss_bytes": _process_rss_bytes(),
+            "embedding_store": self.embedding_store.stats() if self.embedding_store is not None else None,
+        }
+
+    @staticmethod
+    def _load_embedder(model_name: str, device: str, backend: str, store: EmbeddingStore | None) -> LoadedModel:
+        logger.info("Loading embedder model=%s device=%s backend=%s", model_name, device, backend)
+
+        started = time.perf_counter()
+        if backend == "onnx":
+            from agent.onnx_embedder import OnnxE5Embedder
+
+            embedder = OnnxE5Embedder(model_name=model_name, device=device, store=store)
+        else:
+            embedder = E5Embedder(model_name=model_name, device=device, store=store)
+        load_seconds = time.perf_counter() - started
+
+        started = time.perf_counter()
+        embedder.warmup()
+        warmup_seconds = time.perf_counter() - started
+
+        loaded = LoadedModel(
+            model_name=model_name,
+            device=device,
+            backend=backend,
+            model=embedder,
+            load_seconds=load_seconds,
+            warmup_seconds=warmup_seconds,
+            memory_bytes=embedder.memory_bytes(),
+            loaded_at=time.time(),
+        )
+        logger.info(
+            "Embedder ready model=%s device=%s load=%.2fs warmup=%.2fs memory=%s",
+            model_name,
+            device,
+            load_seconds,
+            warmup_seconds,
+            loaded.memory_bytes,
+        )
+        return loaded
+
+
+registry = ModelRegistry(
+    backend=os.getenv("EMBEDDING_BACKEND", "torch").strip().lower(),
+    pool_workers=int(os.getenv("EMBEDDING_POOL_WORKERS", "0")),
+    pool_threshold=int(os.getenv("EMBEDDING_POOL_THRESHOLD", "256")),
+    pool_torch_threads=int(os.getenv("EMBEDDING_POOL_TORCH_THREADS", "1")),
+)
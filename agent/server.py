@@ -1,16 +1,40 @@
+import json
 import logging
 import os
 import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Literal
 
-from fastapi import FastAPI, HTTPException
+from agent.admission import AnalyzeExecutor, QueueFull, limit_torch_threads, set_thread_env
+
+# OpenMP/MKL/OpenBLAS read their thread caps once on load: set them before numpy/torch are imported
+AGENT_TORCH_THREADS = int(os.getenv("AGENT_TORCH_THREADS", "0"))
+set_thread_env(AGENT_TORCH_THREADS)
+
+import numpy as np
+from fastapi import FastAPI, HTTPException, Request, Response
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
 
-from agent import Message
-from agent.themes_extractor import ThemesExtractor
-from agent.summarizer import SummaryBuilder
+from agent import Message, ProgressCallback, ThemeCallback
+from agent.themes_extractor import ThemesExtractor, message_to_doc
+from agent.batcher import MicroBatcher
+from agent.cancellation import CancellationToken, Cancelled, check
+from agent.chunk_store import ChunkSummaryStore
+from agent.embedding_store import EmbeddingStore
+from agent.extractive import select_representative
+from agent.jobs import Job, JobStore, JobStoreFull
+from agent.llm_cache import LLMCache, build_cache_backend
+from agent.pool import SummaryBuilderPool
+from agent.registry import registry
+from agent.sessions import Session, SessionStore
+from agent.theme_matcher import ThemeMatcher, theme_vectors
+from agent.title_memo import ThemeTitleMemo
+from agent.tokens import get_token_counter
 
 
 class MessageIn(BaseModel):
+    id: int | None = None
     user: str = Field(..., min_length=1)
     type: str = Field(..., min_length=1)
     text: str
@@ -20,13 +44,140 @@ class AnalyzeRequest(BaseModel):
     messages: list[MessageIn]
     min_topic_size: int = 10
     include_noise: bool = True
+    dedup: bool = False  # collapsed copies count once for min_topic_size
+    near_duplicate_threshold: float = Field(1.0, gt=0.0, le=1.0)  # 1.0 = exact duplicates only
+    clustering: Literal["bertopic", "kmeans", "agglomerative"] = "bertopic"
+    window_size: int = Field(0, ge=0)
+    window_merge_threshold: float = Field(0.8, gt=0.0, le=1.0)
+    theme_matching: bool = True
+    theme_match_threshold: float = Field(0.9, gt=0.0, le=1.0)
 
     ollama_model: str = "qwen2.5:1.5b-instruct"
     context_window_tokens: int = 4096
+    temperature: float = 0.5
+    theme_concurrency: int = Field(1, ge=1)
+    map_concurrency: int = Field(1, ge=1)
+    reduce_mode: Literal["tree", "loop"] = "tree"
+    fused: bool = False
+
+    extractive: bool = False
+    extractive_budget_tokens: int | None = Field(None, ge=1)
+    extractive_mmr_lambda: float = Field(0.5, ge=0.0, le=1.0)
     previous_summary: dict[str, str] | None = None
 
+    # with chat_id set the result also (re)starts the agent session of this chat/thread
+    chat_id: int | None = None
+    thread_id: int | None = None
+
+
+class DeltaAnalyzeRequest(AnalyzeRequest):
+    """Only new messages; previous summaries come from the session at `session_version`."""
+    chat_id: int
+    session_version: int = Field(..., ge=1)
+
+
+class JobRequest(AnalyzeRequest):
+    """/analyze body for POST /jobs and /analyze/stream; with session_version set it runs as /analyze/delta."""
+    session_version: int | None = Field(None, ge=1)
+
+
+class EmbedRequest(BaseModel):
+    messages: list[MessageIn]
+
 
 OLLAMA_BASE_URL = os.getenv("OLLAMA_BASE_URL")
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "intfloat/multilingual-e5-small")
+EMBEDDING_DEVICE = os.getenv("EMBEDDING_DEVICE", "cpu")
+SUMMARY_BUILDER_POOL_SIZE = int(os.getenv("SUMMARY_BUILDER_POOL_SIZE", "4"))
+REDIS_URL = os.getenv("REDIS_URL")
+CACHE_SQLITE_PATH = os.getenv("CACHE_SQLITE_PATH", "agent_cache.sqlite3")
+LLM_CACHE_BACKEND = os.getenv("LLM_CACHE_BACKEND", "memory")
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "10000"))
+LLM_CACHE_TTL_SECONDS = int(os.getenv("LLM_CACHE_TTL_SECONDS", str(24 * 3600)))
+
+_llm_cache_backend = build_cache_backend(
+    LLM_CACHE_BACKEND,
+    max_entries=LLM_CACHE_MAX_ENTRIES,
+    ttl_seconds=LLM_CACHE_TTL_SECONDS,
+    sqlite_path=CACHE_SQLITE_PATH,
+    redis_url=REDIS_URL,
+    namespace="llm_cache",
+)
+llm_cache = LLMCache(_llm_cache_backend) if _llm_cache_backend is not None else None
+
+CHUNK_STORE_BACKEND = os.getenv("CHUNK_STORE_BACKEND", "sqlite")
+CHUNK_STORE_MAX_ENTRIES = int(os.getenv("CHUNK_STORE_MAX_ENTRIES", "50000"))
+CHUNK_STORE_TTL_SECONDS = int(os.getenv("CHUNK_STORE_TTL_SECONDS", str(24 * 3600)))
+
+_chunk_store_backend = build_cache_backend(
+    CHUNK_STORE_BACKEND,
+    max_entries=CHUNK_STORE_MAX_ENTRIES,
+    ttl_seconds=CHUNK_STORE_TTL_SECONDS,
+    sqlite_path=CACHE_SQLITE_PATH,
+    redis_url=REDIS_URL,
+    namespace="chunk_summaries",
+)
+chunk_store = ChunkSummaryStore(_chunk_store_backend) if _chunk_store_backend is not None else None
+
+TITLE_MEMO_BACKEND = os.getenv("TITLE_MEMO_BACKEND", "sqlite")
+TITLE_MEMO_MAX_ENTRIES = int(os.getenv("TITLE_MEMO_MAX_ENTRIES", "20000"))
+TITLE_MEMO_TTL_SECONDS = int(os.getenv("TITLE_MEMO_TTL_SECONDS", str(7 * 24 * 3600)))
+
+_title_memo_backend = build_cache_backend(
+    TITLE_MEMO_BACKEND,
+    max_entries=TITLE_MEMO_MAX_ENTRIES,
+    ttl_seconds=TITLE_MEMO_TTL_SECONDS,
+    sqlite_path=CACHE_SQLITE_PATH,
+    redis_url=REDIS_URL,
+    namespace="theme_titles",
+)
+title_memo = ThemeTitleMemo(_title_memo_backend) if _title_memo_backend is not None else None
+
+EMBEDDING_STORE_ENABLED = os.getenv("EMBEDDING_STORE_ENABLED", "true").strip().lower() in {"1", "true", "yes", "y", "on"}
+EMBEDDING_STORE_TTL_SECONDS = int(os.getenv("EMBEDDING_STORE_TTL_SECONDS", str(24 * 3600)))
+
+if EMBEDDING_STORE_ENABLED:
+    registry.set_embedding_store(EmbeddingStore(CACHE_SQLITE_PATH, ttl_seconds=EMBEDDING_STORE_TTL_SECONDS))
+
+AGENT_SESSIONS_MAX_SIZE = int(os.getenv("AGENT_SESSIONS_MAX_SIZE", "1000"))
+AGENT_SESSION_TTL_SECONDS = int(os.getenv("AGENT_SESSION_TTL_SECONDS", str(7 * 24 * 3600)))
+
+sessions = SessionStore(max_sessions=AGENT_SESSIONS_MAX_SIZE, ttl_seconds=AGENT_SESSION_TTL_SECONDS)
+
+JOB_TTL_SECONDS = int(os.getenv("JOB_TTL_SECONDS", "3600"))
+JOBS_MAX_SIZE = int(os.getenv("JOBS_MAX_SIZE", "1000"))
+
+jobs = JobStore(ttl_seconds=JOB_TTL_SECONDS, max_jobs=JOBS_MAX_SIZE)
+
+AGENT_WORKERS = int(os.getenv("AGENT_WORKERS", "2"))
+AGENT_MAX_QUEUE = int(os.getenv("AGENT_MAX_QUEUE", "8"))
+
+analyze_executor = AnalyzeExecutor(workers=AGENT_WORKERS, max_queue=AGENT_MAX_QUEUE)
+
+EMBED_MAX_BATCH = int(os.getenv("EMBED_MAX_BATCH", "64"))
+EMBED_MAX_WAIT_MS = int(os.getenv("EMBED_MAX_WAIT_MS", "50"))
+
+
+def _embed_docs(docs: list[str]) -> None:
+    registry.get_embedder(EMBEDDING_MODEL, EMBEDDING_DEVICE).embed_documents(docs)
+
+
+# one worker, so ingest encoding never takes more than one analyze worker's share of
+# the CPU (the torch/OpenMP thread cap is process-wide and applies here too)
+embed_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="embed")
+embed_batcher = MicroBatcher(
+    _embed_docs,
+    max_batch=EMBED_MAX_BATCH,
+    max_wait_ms=EMBED_MAX_WAIT_MS,
+    executor=embed_executor,
+)
+
+builder_pool = SummaryBuilderPool(
+    max_size=SUMMARY_BUILDER_POOL_SIZE,
+    llm_cache=llm_cache,
+    chunk_store=chunk_store,
+    title_memo=title_memo,
+)
 
 app = FastAPI(title="Themes + Summaries API")
 
@@ -37,9 +188,33 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
+@app.on_event("startup")
+def _startup():
+    registry.get_embedder(EMBEDDING_MODEL, EMBEDDING_DEVICE)
+    limit_torch_threads(AGENT_TORCH_THREADS)  # process-wide; torch is loaded by now
+
+
+@app.on_event("shutdown")
+def _shutdown():
+    analyze_executor.shutdown()
+    embed_executor.shutdown(wait=False, cancel_futures=True)
+    registry.close()
+
+
 @app.get("/health")
-def health() -> dict[str, bool]:
-    return {"ok": True}
+def health() -> dict[str, Any]:
+    return {
+        "ok": True,
+        **registry.stats(),
+        "builder_pool": builder_pool.stats(),
+        "llm_cache": llm_cache.stats() if llm_cache is not None else None,
+        "chunk_store": chunk_store.stats() if chunk_store is not None else None,
+        "title_memo": title_memo.stats() if title_memo is not None else None,
+        "embed_batcher": embed_batcher.stats(),
+        "sessions": sessions.stats(),
+        "jobs": jobs.stats(),
+        "analyze_executor": analyze_executor.stats(),
+    }
 
 
 '''
@@ -66,27 +241,376 @@ def analyze(req: AnalyzeRequest) -> dict[str, dict[str, str]]:
 '''
 
 
+def _admit(fn, *args) -> asyncio.Future:
+    """Run `fn(*args)` on the analyze executor, or answer 429 with Retry-After if it is saturated."""
+    try:
+        return analyze_executor.submit(fn, *args)
+    except QueueFull as exc:
+        logger.warning("Rejecting analyze request: %s", exc)
+        raise HTTPException(
+            status_code=429,
+            detail="agent is busy, retry later",
+            headers={"Retry-After": str(exc.retry_after)},
+        ) from exc
+
+
+async def _run_until_disconnect(request: Request, fn, *args) -> Any:
+    """
+    Run `fn(*args, cancel)` on the analyze executor while watching the client.
+    If the client goes away (bot timeout, restart), the pipeline is cancelled at its
+    next check instead of finishing LLM work nobody will read.
+    """
+    cancel = CancellationToken()
+    future = _admit(fn, *args, cancel)
+    while True:
+        done, _ = await asyncio.wait({future}, timeout=1.0)
+        if done:
+            break
+        if await request.is_disconnected():
+            logger.info("Client disconnected, cancelling %s", request.url.path)
+            cancel.cancel("client disconnected")
+            break
+    try:
+        return await future
+    except Cancelled as exc:
+        raise HTTPException(status_code=499, detail=str(exc)) from exc
+
+
 @app.post("/analyze")
-async def analyze(req: AnalyzeRequest) -> dict[str, dict[str, str]]:
+async def analyze(req: AnalyzeRequest, request: Request, response: Response) -> dict[str, dict[str, str]]:
+    result, session = await _run_until_disconnect(request, _analyze_full_sync, req, None, None)
+    if session is not None:
+        response.headers["X-Session-Version"] = str(session.version)
+    return result
+
+
+@app.post("/analyze/delta")
+async def analyze_delta(req: DeltaAnalyzeRequest, request: Request, response: Response) -> dict[str, dict[str, str]]:
+    """
+    Same as /analyze, but the bot sends only messages after its checkpoint and the
+    session version it saw last. 409 means the session is gone or moved on; the bot
+    then falls back to a full /analyze with previous_summary.
+
+    The version is checked before any work starts. If another request commits while
+    this one runs, the result is still returned, just without X-Session-Version.
+    """
+    result, session = await _run_until_disconnect(request, _analyze_delta_sync, req, None, None)
+    if session is not None:
+        response.headers["X-Session-Version"] = str(session.version)
+    return result
+
+
+@app.post("/analyze/stream")
+async def analyze_stream(req: JobRequest) -> StreamingResponse:
+    """
+    /analyze as NDJSON: one line per event as soon as it happens.
+
+        {"event": "progress", "stage": ..., "done": ..., "total": ...}
+        {"event": "theme", "theme": ..., "summary": ...}       # each finished theme
+        {"event": "done", "result": {...}, "session_version": ...}  # null: session not stored
+        {"event": "error", "status_code": ..., "error": ...}   # 409 = stale session, before any theme
+
+    `result` in the final event is the same dict /analyze returns (including
+    untouched previous themes that were never streamed).
+    """
+    if req.session_version is not None and req.chat_id is None:
+        raise HTTPException(status_code=422, detail="session_version requires chat_id")
+
     loop = asyncio.get_running_loop()
-    return await loop.run_in_executor(None, _analyze_sync, req)
+    queue: asyncio.Queue = asyncio.Queue()
+
+    def emit(event: dict[str, Any]) -> None:
+        loop.call_soon_threadsafe(queue.put_nowait, event)
+
+    def progress(stage: str, done: int, total: int) -> None:
+        emit({"event": "progress", "stage": stage, "done": done, "total": total})
+
+    def on_theme(theme: str, summary: str) -> None:
+        emit({"event": "theme", "theme": theme, "summary": summary})
+
+    cancel = CancellationToken()
+
+    def run() -> None:
+        try:
+            result, session = _analyze_any_sync(req, progress, on_theme, cancel)
+        except Cancelled as exc:
+            logger.info("Streaming analyze cancelled: %s", exc)
+            return
+        except HTTPException as exc:
+            emit({"event": "error", "status_code": exc.status_code, "error": str(exc.detail)})
+            return
+        except Exception as exc:
+            logger.exception("Streaming analyze failed: %s", exc)
+            emit({"event": "error", "status_code": 500, "error": str(exc)})
+            return
+        emit({"event": "done", "result": result, "session_version": session.version if session else None})
+
+    _admit(run)
+
+    async def events():
+        finished = False
+        try:
+            while True:
+                event = await queue.get()
+                yield json.dumps(event, ensure_ascii=False) + "\n"
+                if event["event"] in ("done", "error"):
+                    finished = True
+                    return
+        finally:
+            # the response is torn down early only when the client disconnected
+            if not finished:
+                logger.info("Stream client disconnected, cancelling analyze")
+                cancel.cancel("client disconnected")
+
+    return StreamingResponse(events(), media_type="application/x-ndjson")
+
+
+@app.post("/jobs", status_code=202)
+async def create_job(req: JobRequest) -> dict[str, Any]:
+    """
+    Start /analyze (or /analyze/delta) in the background and return the job id at once.
+
+    Poll GET /jobs/{id} for stage progress; the result is kept for JOB_TTL_SECONDS
+    after the job finishes.
+    """
+    if req.session_version is not None and req.chat_id is None:
+        raise HTTPException(status_code=422, detail="session_version requires chat_id")
+
+    try:
+        job = jobs.create()
+    except JobStoreFull as exc:
+        logger.warning("Rejecting job: %s", exc)
+        raise HTTPException(
+            status_code=429,
+            detail="too many unfinished jobs, retry later",
+            headers={"Retry-After": str(analyze_executor.retry_after())},
+        ) from exc
+    try:
+        _admit(_run_job, job, req)
+    except HTTPException:
+        jobs.discard(job.id)
+        raise
+    return job.to_dict()
+
+
+@app.get("/jobs/{job_id}")
+def get_job(job_id: str) -> dict[str, Any]:
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="job not found or expired")
+    return job.to_dict()
+
+
+@app.delete("/jobs/{job_id}")
+def delete_job(job_id: str) -> dict[str, Any]:
+    """Cancel a queued or running job; it stops at its next check (between LLM calls)."""
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="job not found or expired")
+    jobs.cancel(job)
+    return job.to_dict()
+
+
+@app.post("/embed")
+async def embed(req: EmbedRequest) -> dict[str, Any]:
+    """
+    Precompute embeddings at ingest time so /analyze only has to cluster.
 
+    Concurrent calls are micro-batched into one encode; vectors land in the embedding store.
+    Without a store there is nothing to precompute into, so the call is a no-op.
+    """
+    if registry.embedding_store is None:
+        return {"embedded": 0, "stored": False}
+    docs = [
+        message_to_doc(Message(user=m.user, type=m.type, text=m.text, id=m.id))
+        for m in req.messages
+        if m.text.strip()
+    ]
+    await embed_batcher.submit(docs)
+    return {"embedded": len(docs), "stored": True}
 
-def _analyze_sync(req: AnalyzeRequest) -> dict[str, dict[str, str]]:
+
+def _run_job(job: Job, req: JobRequest) -> None:
+    jobs.start(job)
+
+    def progress(stage: str, done: int, total: int) -> None:
+        jobs.progress(job, stage, done, total)
+
+    try:
+        result, session = _analyze_any_sync(req, progress, None, job.cancel)
+    except Cancelled:
+        logger.info("Job %s cancelled: %s", job.id, job.cancel.reason)
+        jobs.cancelled(job)
+        return
+    except HTTPException as exc:
+        jobs.fail(job, str(exc.detail), status_code=exc.status_code)
+        return
+    except Exception as exc:
+        logger.exception("Job %s failed: %s", job.id, exc)
+        jobs.fail(job, str(exc))
+        return
+    jobs.finish(job, result, session.version if session is not None else None)
+
+
+def _analyze_any_sync(
+        req: JobRequest,
+        progress: ProgressCallback | None = None,
+        on_theme: ThemeCallback | None = None,
+        cancel: CancellationToken | None = None,
+) -> tuple[dict[str, dict[str, str]], Session | None]:
+    """Full or delta analyze, depending on whether the request carries session_version."""
+    if req.session_version is not None:
+        return _analyze_delta_sync(DeltaAnalyzeRequest(**req.model_dump()), progress, on_theme, cancel)
+    return _analyze_full_sync(req, progress, on_theme, cancel)
+
+
+def _analyze_full_sync(
+        req: AnalyzeRequest,
+        progress: ProgressCallback | None = None,
+        on_theme: ThemeCallback | None = None,
+        cancel: CancellationToken | None = None,
+) -> tuple[dict[str, dict[str, str]], Session | None]:
+    result = _analyze_sync(req, req.previous_summary, progress=progress, on_theme=on_theme, cancel=cancel)
+    session = None
+    if req.chat_id is not None:
+        session = _commit_session(req.chat_id, req.thread_id, None, result, {}, {})
+    return result, session
+
+
+def _analyze_delta_sync(
+        req: DeltaAnalyzeRequest,
+        progress: ProgressCallback | None = None,
+        on_theme: ThemeCallback | None = None,
+        cancel: CancellationToken | None = None,
+) -> tuple[dict[str, dict[str, str]], Session | None]:
+    """
+    Analyze on top of the stored session. A stale version is refused (409) before any
+    work; a conflict at commit time is not an error, because themes may already be
+    streamed: the result is returned with no session and the next request is a full one.
+    """
+    session = sessions.get(req.chat_id, req.thread_id)
+    if session is None or session.version != req.session_version:
+        raise HTTPException(status_code=409, detail={"session_version": session.version if session else None})
+
+    result = _analyze_sync(
+        req,
+        session.summaries,
+        session.centroids,
+        progress=progress,
+        on_theme=on_theme,
+        cancel=cancel,
+    )
+    committed = _commit_session(
+        req.chat_id,
+        req.thread_id,
+        session.version,
+        result,
+        session.summaries,
+        session.centroids,
+    )
+    if committed is None:
+        logger.warning(
+            "Session of chat_id=%s thread_id=%s moved on during delta analyze; result is not stored",
+            req.chat_id,
+            req.thread_id,
+        )
+    return result, committed
+
+
+def _commit_session(
+        chat_id: int,
+        thread_id: int | None,
+        base_version: int | None,
+        result: dict[str, dict[str, str]],
+        previous: dict[str, str],
+        previous_centroids: dict[str, np.ndarray],
+) -> Session | None:
+    """Store the summary state of `result`; centroids of themes whose summary did not change are reused."""
+    summaries: dict[str, str] = {}
+    for item in result.values():
+        theme = (item.get("theme") or "").strip()
+        summary = (item.get("summary") or "").strip()
+        if theme and summary:
+            summaries[theme] = summary
+
+    embedder = registry.get_embedder(EMBEDDING_MODEL, EMBEDDING_DEVICE)
+    known = {n: v for n, v in previous_centroids.items() if previous.get(n) == summaries.get(n)}
+    # theme docs are not messages: keep them out of the message embedding store
+    centroids = theme_vectors(
+        summaries,
+        embed=embedder.encode_uncached,
+        known=known,
+    )
+    return sessions.commit(chat_id, thread_id, base_version, summaries, centroids)
+
+
+def _analyze_sync(
+        req: AnalyzeRequest,
+        previous_summary: dict[str, str] | None = None,
+        previous_centroids: dict[str, np.ndarray] | None = None,
+        progress: ProgressCallback | None = None,
+        on_theme: ThemeCallback | None = None,
+        cancel: CancellationToken | None = None,
+) -> dict[str, dict[str, str]]:
     logger.info("Analyze request: messages=%s", len(req.messages))
 
-    messages = [Message(user=m.user, type=m.type, text=m.text) for m in req.messages]
+    messages = [Message(user=m.user, type=m.type, text=m.text, id=m.id) for m in req.messages]
 
+    embedder = registry.get_embedder(EMBEDDING_MODEL, EMBEDDING_DEVICE)
     extractor = ThemesExtractor(
         min_topic_size=req.min_topic_size,
         include_noise=req.include_noise,
+        dedup=req.dedup,
+        near_duplicate_threshold=req.near_duplicate_threshold,
+        clustering=req.clustering,
+        window_size=req.window_size,
+        window_merge_threshold=req.window_merge_threshold,
+        embedder=embedder,
+        progress=progress,
+        cancel=cancel,
     )
     grouped = extractor(messages)
+    check(cancel)
 
-    builder = SummaryBuilder(
+    builder = builder_pool.get(
         model=req.ollama_model,
         context_window_tokens=req.context_window_tokens,
+        temperature=req.temperature,
         base_url=OLLAMA_BASE_URL,
+        map_concurrency=req.map_concurrency,
+        reduce_mode=req.reduce_mode,
     )
 
-    return builder(grouped, previous_summary=req.previous_summary)
+    if req.extractive:
+        budget = req.extractive_budget_tokens or builder.per_chunk_target_tokens
+        token_count = get_token_counter(req.ollama_model)
+        grouped = {
+            theme: select_representative(
+                msgs,
+                extractor.embeddings_for(msgs),
+                token_count,
+                budget,
+                mmr_lambda=req.extractive_mmr_lambda,
+            )
+            for theme, msgs in grouped.items()
+        }
+
+    matcher = None
+    if req.theme_matching and previous_summary:
+        matcher = ThemeMatcher(
+            previous_summary,
+            embed=lambda texts: np.asarray(embedder.embed_documents(texts), dtype=np.float32),
+            threshold=req.theme_match_threshold,
+            vectors=previous_centroids,
+        )
+
+    return builder(
+        grouped,
+        previous_summary=previous_summary,
+        max_concurrency=req.theme_concurrency,
+        fused=req.fused,
+        matcher=matcher,
+        progress=progress,
+        on_theme=on_theme,
+        cancel=cancel,
+    )
@@ -0,0 +1,100 @@
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any
+
+import numpy as np
+
+
+@dataclass
+class Session:
+    """
+    Agent-side state of one (chat_id, thread_id) between /analyze calls.
+
+    `summaries` is the theme -> summary state the bot would otherwise resend as
+    previous_summary; `centroids` are the normalized title + summary embeddings of
+    those themes, used by ThemeMatcher without re-encoding. Message embeddings
+    themselves live in the embedding store.
+    """
+    chat_id: int
+    thread_id: int | None
+    version: int = 0
+    summaries: dict[str, str] = field(default_factory=dict)
+    centroids: dict[str, np.ndarray] = field(default_factory=dict)
+    updated_at: float = field(default_factory=time.time)
+
+
+class SessionStore:
+    """
+    Bounded LRU of sessions with a TTL.
+
+    Every successful commit bumps the version; a commit against a stale version is
+    refused, so two racing delta requests cannot both extend the same state.
+    """
+
+    def __init__(self, max_sessions: int = 1000, ttl_seconds: int | None = 7 * 24 * 3600):
+        self.max_sessions = max(1, int(max_sessions))
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._sessions: OrderedDict[tuple[int, int], Session] = OrderedDict()
+        self.conflicts = 0
+
+    @staticmethod
+    def _key(chat_id: int, thread_id: int | None) -> tuple[int, int]:
+        return int(chat_id), int(thread_id or 0)
+
+    def get(self, chat_id: int, thread_id: int | None) -> Session | None:
+        key = self._key(chat_id, thread_id)
+        with self._lock:
+            session = self._sessions.get(key)
+            if session is None:
+                return None
+            if self.ttl_seconds and time.time() - session.updated_at > self.ttl_seconds:
+                del self._sessions[key]
+                return None
+            self._sessions.move_to_end(key)
+            return session
+
+    def commit(
+            self,
+            chat_id: int,
+            thread_id: int | None,
+            base_version: int | None,
+            summaries: dict[str, str],
+            centroids: dict[str, np.ndarray],
+    ) -> Session | None:
+        """
+        Store new state on top of `base_version` and return the new session.
+
+        `base_version=None` replaces whatever is stored (full request). Returns None
+        if the stored version moved on since `base_version` was read.
+        """
+        key = self._key(chat_id, thread_id)
+        with self._lock:
+            current = self._sessions.get(key)
+            current_version = current.version if current is not None else 0
+            if base_version is not None and (current is None or current_version != base_version):
+                self.conflicts += 1
+                return None
+
+            session = Session(
+                chat_id=int(chat_id),
+                thread_id=thread_id,
+                version=current_version + 1,
+                summaries=dict(summaries),
+                centroids=dict(centroids),
+            )
+            self._sessions[key] = session
+            self._sessions.move_to_end(key)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+            return session
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            return {
+                "size": len(self._sessions),
+                "max_size": self.max_sessions,
+                "conflicts": self.conflicts,
+            }
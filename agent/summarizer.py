@@ -1,3 +1,9 @@
+import hashlib
+import json
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 from typing import Callable
 
 from langchain_core.output_parsers import StrOutputParser
@@ -5,44 +11,60 @@ from langchain_core.prompts import ChatPromptTemplate
 from langchain_ollama import ChatOllama
 from langgraph.graph import END, StateGraph
 
-from agent import Message
-from agent.chains import build_reduce_chain, build_summarize_chain, build_theme_chain, build_update_chain, build_refine_theme_chain
-
-
-def _default_token_counter(llm: ChatOllama) -> Callable[[str], int]:
+from agent import Message, ProgressCallback, ThemeCallback
+from agent.cancellation import CancellationToken, check
+from agent.chains import (
+    build_fused_summary_chain,
+    build_fused_update_chain,
+    build_reduce_chain,
+    build_refine_theme_chain,
+    build_summarize_chain,
+    build_theme_chain,
+    build_update_chain,
+)
+from agent.chunk_store import ChunkSummaryStore
+from agent.llm_cache import LLMCache
+from agent.theme_matcher import ThemeMatcher
+from agent.title_memo import ThemeTitleMemo
+from agent.tokens import get_token_counter
+
+
+def _token_sizes(items: list[str], token_count: Callable[[str], int]) -> list[int]:
     """
-    Build a token counting function for a given Ollama chat model.
-
-    Tries to use `llm.get_num_tokens(text)` if available (some LangChain LLMs expose it),
-    otherwise falls back to a cheap heuristic: ~1 token per 4 characters.
-
-    The returned callable always returns at least 1.
+    Count tokens for all `items`, in one batch if `token_count` supports `count_many`.
     """
-
-    def count(text: str) -> int:
-        fn = getattr(llm, "get_num_tokens", None)
-        if callable(fn):
-            try:
-                return int(fn(text))
-            except Exception:
-                pass
-        return max(1, len(text) // 4)
-
-    return count
+    count_many = getattr(token_count, "count_many", None)
+    if callable(count_many):
+        return list(count_many(items))
+    return [token_count(item) for item in items]
 
 
 def _parse_keywords(theme_key: str) -> list[str]:
     """
     Parse keywords from a theme key produced by ThemesExtractor.
 
-    Expected format: "kw1 / kw2 / kw3" (slashes as separators).
+    Expected format: "kw1 / kw2 / kw3" or one keyword per line (what
+    ThemesExtractor._name_from_keywords produces).
     Returns up to 12 cleaned keywords. If parsing yields nothing, returns the stripped
     original key as a single-element list.
     """
-    parts = [p.strip() for p in theme_key.split("/") if p.strip()]
+    parts = [p.strip() for p in re.split(r"/|\n", theme_key) if p.strip()]
     return parts[:12] if parts else [theme_key.strip()]
 
 
+def _message_line(m: Message) -> str | None:
+    """
+    Render one message as a prompt line "<user> [<type>]: <text>", or None if the text is empty.
+    Collapsed duplicates are marked as "<user> [<type>] (×N): <text>".
+    """
+    t = m.text.strip()
+    if not t:
+        return None
+    if m.weight > 1:
+        return f"{m.user} [{m.type}] (×{m.weight}): {t}"
+    return f"{m.user} [{m.type}]: {t}"
+
+
 def _messages_to_text(messages: list[Message]) -> str:
     """
     Convert a list of Message objects into a single multiline string.
@@ -52,49 +74,174 @@ def _messages_to_text(messages: list[Message]) -> str:
 
     Empty/whitespace-only texts are skipped.
     """
-    lines: list[str] = []
-    for m in messages:
-        t = m.text.strip()
-        if t:
-            lines.append(f"{m.user} [{m.type}]: {t}")
+    lines = [ln for ln in (_message_line(m) for m in messages) if ln]
     return "\n".join(lines)
 
 
-def _chunk_by_tokens(text: str, token_count: Callable[[str], int], max_tokens: int) -> list[str]:
+@dataclass
+class Chunk:
     """
-    Split `text` into chunks that fit into `max_tokens` according to `token_count`.
+    A run of consecutive messages that fits into one summarize call.
 
-    Strategy:
-    - Split by lines (keeps chat structure stable).
-    - Greedily pack consecutive non-empty lines into a buffer until adding the next line
-      would exceed `max_tokens`, then flush the buffer as a chunk.
+    `key` is stable across requests: message-id range plus a hash of the rendered text,
+    so edits (e.g. OCR text appended later) produce a new identity.
+    """
+    text: str
+    first_id: int | None
+    last_id: int | None
+
+    @property
+    def digest(self) -> str:
+        return hashlib.sha1(self.text.encode("utf-8")).hexdigest()
+
+    @property
+    def key(self) -> str | None:
+        if self.first_id is None or self.last_id is None:
+            return None
+        return f"{self.first_id}-{self.last_id}:{self.digest}"
 
-    Returns a list of chunk strings. Returns [] if `text` has no non-empty lines.
+
+def _pack_by_tokens(items: list[str], token_count: Callable[[str], int], max_tokens: int) -> list[list[str]]:
     """
-    lines = [ln for ln in text.splitlines() if ln.strip()]
-    if not lines:
-        return []
+    Greedily pack consecutive `items` into groups whose total size fits into `max_tokens`.
 
-    chunks: list[str] = []
+    An item larger than `max_tokens` forms a group on its own.
+    Returns [] if `items` is empty.
+    """
+    groups: list[list[str]] = []
     buf: list[str] = []
     buf_toks = 0
 
-    for ln in lines:
-        ln_toks = token_count(ln)
-        if buf and (buf_toks + ln_toks > max_tokens):
-            chunks.append("\n".join(buf))
-            buf = [ln]
-            buf_toks = ln_toks
+    for item, item_toks in zip(items, _token_sizes(items, token_count)):
+        if buf and (buf_toks + item_toks > max_tokens):
+            groups.append(buf)
+            buf = [item]
+            buf_toks = item_toks
         else:
-            buf.append(ln)
-            buf_toks += ln_toks
+            buf.append(item)
+            buf_toks += item_toks
 
     if buf:
-        chunks.append("\n".join(buf))
+        groups.append(buf)
+
+    return groups
+
+
+def _balanced_batches(items: list[str], token_count: Callable[[str], int], max_tokens: int) -> list[list[str]]:
+    """
+    Pack `items` into the same number of groups as greedy packing, but with similar sizes.
 
+    Greedy packing tends to leave a tiny last group; re-packing with a target of
+    total / n_groups evens the groups out so parallel reduce calls finish together.
+    Falls back to the greedy result if the balanced target would need more groups.
+    """
+    greedy = _pack_by_tokens(items, token_count, max_tokens)
+    if len(greedy) <= 1:
+        return greedy
+
+    total = sum(_token_sizes(items, token_count))
+    target = min(max_tokens, -(-total // len(greedy)))
+    balanced = _pack_by_tokens(items, token_count, target)
+    return balanced if len(balanced) <= len(greedy) else greedy
+
+
+def _chunk_messages(messages: list[Message], token_count: Callable[[str], int], max_tokens: int) -> list[Chunk]:
+    """
+    Split messages into chunks that fit into `max_tokens` according to `token_count`.
+
+    Every message is rendered as one line (see _message_line; empty ones are skipped)
+    and consecutive lines are packed by _pack_by_tokens, so a message is never split.
+    Each chunk keeps the id range of its messages; chunks of messages without ids get
+    first_id/last_id = None. Returns [] if no message has text.
+    """
+    rendered = [(m, ln) for m, ln in ((m, _message_line(m)) for m in messages) if ln]
+    if not rendered:
+        return []
+
+    chunks: list[Chunk] = []
+    start = 0
+    for group in _pack_by_tokens([ln for _, ln in rendered], token_count, max_tokens):
+        members = rendered[start:start + len(group)]
+        start += len(group)
+        ids = [m.id for m, _ in members]
+        has_ids = all(i is not None for i in ids)
+        chunks.append(
+            Chunk(
+                text="\n".join(group),
+                first_id=ids[0] if has_ids else None,
+                last_id=ids[-1] if has_ids else None,
+            )
+        )
     return chunks
 
 
+def _summary_to_text(summary) -> str:
+    if isinstance(summary, list):
+        lines = [str(x).strip() for x in summary if str(x).strip()]
+        return "\n".join(ln if ln.startswith(("-", "•", "*")) else f"- {ln}" for ln in lines)
+    return str(summary or "").strip()
+
+
+def _recover_summary(fragment: str) -> str:
+    """
+    Best-effort summary from a "summary" value that is not valid JSON, e.g. a list
+    or string cut off by the token limit: complete quoted items plus the unclosed
+    trailing one.
+    """
+    if not fragment.startswith("["):
+        return fragment.strip('"').strip()
+    items = re.findall(r'"((?:[^"\\]|\\.)*)"', fragment)
+    tail = re.search(r'(?:^\[|,)\s*"((?:[^"\\]|\\.)*)$', fragment)
+    if tail and tail.group(1).strip():
+        items.append(tail.group(1))
+    return _summary_to_text(items)
+
+
+def _parse_fused_output(raw: str, fallback_title: str) -> tuple[str, str]:
+    """
+    Parse the {"title": ..., "summary": ...} answer of the fused chains.
+
+    Small models often wrap JSON in code fences, add text around it or break the
+    quoting, so parsing degrades step by step:
+    1. the outermost {...} block as JSON;
+    2. regex extraction of the "title" / "summary" fields;
+    3. the whole answer as the summary with `fallback_title`.
+    """
+    text = re.sub(r"^```(?:json)?|```$", "", raw.strip(), flags=re.MULTILINE).strip()
+
+    start, end = text.find("{"), text.rfind("}")
+    if start != -1 and end > start:
+        block = text[start:end + 1]
+        data = None
+        for candidate in (block, re.sub(r",\s*([\]}])", r"\1", block)):  # second try drops trailing commas
+            try:
+                data = json.loads(candidate)
+                break
+            except json.JSONDecodeError:
+                continue
+        if isinstance(data, dict):
+            title = str(data.get("title") or "").strip() or fallback_title
+            return title, _summary_to_text(data.get("summary"))
+
+    title_match = re.search(r'"title"\s*:\s*"([^"]*)"', text)
+    summary_match = re.search(
+        r'"summary"\s*:\s*(\[.*?\]|"(?:[^"\\]|\\.)*"|\[.*|".*)',  # last two: value cut off mid-way
+        text,
+        flags=re.DOTALL,
+    )
+    if title_match or summary_match:
+        title = (title_match.group(1).strip() if title_match else "") or fallback_title
+        summary = ""
+        if summary_match:
+            try:
+                summary = _summary_to_text(json.loads(summary_match.group(1)))
+            except json.JSONDecodeError:
+                summary = _recover_summary(summary_match.group(1).strip())
+        return title, summary
+
+    return fallback_title, text
+
+
 class SummaryBuilder:
     """
     Input:  dict[theme_key -> list[Message]]  (theme_key ~= "k1 / k2 / k3")
@@ -110,6 +257,12 @@ class SummaryBuilder:
             per_chunk_target_tokens: int | None = None,
             max_rounds: int = 8,
             temperature: float = 0.5,
+            theme_concurrency: int = 1,
+            map_concurrency: int = 1,
+            reduce_mode: str = "tree",
+            llm_cache: LLMCache | None = None,
+            chunk_store: ChunkSummaryStore | None = None,
+            title_memo: ThemeTitleMemo | None = None,
     ):
         llm_kwargs = {
             "model": model,
@@ -121,11 +274,20 @@ class SummaryBuilder:
         if base_url:
             llm_kwargs["base_url"] = base_url
         self.llm = ChatOllama(**llm_kwargs)
+        self.model = model
+        self.temperature = float(temperature)
+        self.chunk_store = chunk_store
+        self.title_memo = title_memo
         self.context_window_tokens = int(context_window_tokens)
         self.reserved_output_tokens = int(reserved_output_tokens)
         self.max_rounds = int(max_rounds)
+        self.theme_concurrency = max(1, int(theme_concurrency))
+        self.map_concurrency = max(1, int(map_concurrency))
+        if reduce_mode not in ("tree", "loop"):
+            raise ValueError(f"Unknown reduce_mode: {reduce_mode!r}")
+        self.reduce_mode = reduce_mode
 
-        self._count_tokens = _default_token_counter(self.llm)
+        self._count_tokens = get_token_counter(model)
 
         self.effective_window_tokens = max(
             512,
@@ -138,78 +300,90 @@ class SummaryBuilder:
         self._summarize_chain = build_summarize_chain(self.llm)
         self._reduce_chain = build_reduce_chain(self.llm)
         self._update_chain = build_update_chain(self.llm)
+        self._fused_summary_chain = build_fused_summary_chain(self.llm)
+        self._fused_update_chain = build_fused_update_chain(self.llm)
+
+        if llm_cache is not None:
+            for name in ("theme", "refine_theme", "summarize", "reduce", "update", "fused_summary", "fused_update"):
+                attr = f"_{name}_chain"
+                setattr(self, attr, llm_cache.wrap(name, getattr(self, attr), model, temperature))
+
         self._graph = self._build_graph()
 
     def __call__(
             self,
             grouped: dict[str, list[Message]],
             previous_summary: dict[str, str] | None = None,
+            max_concurrency: int | None = None,
+            fused: bool = False,
+            matcher: ThemeMatcher | None = None,
+            progress: ProgressCallback | None = None,
+            on_theme: ThemeCallback | None = None,
+            cancel: CancellationToken | None = None,
     ) -> dict[str, dict[str, str]]:
+        """
+        Summarize every theme in `grouped`.
+
+        Themes are independent, so up to `max_concurrency` of them (default:
+        `self.theme_concurrency`) are processed in parallel threads against Ollama.
+        The output keeps the order of `grouped`, followed by untouched previous themes.
+
+        With `fused=True`, themes that fit into one chunk get title and summary from a
+        single JSON-producing call (plus one merge call if the theme existed before).
+
+        `matcher` maps a new theme to a previous one (e.g. by embedding similarity);
+        without it only exact title matches are merged.
+
+        `progress("summarizing", done, total)` and `on_theme(theme, summary)` are called
+        as themes complete (from worker threads, in completion order).
+
+        `cancel` is checked before every LLM call and graph step; once it is cancelled
+        the remaining work is dropped and Cancelled is raised.
+        """
 
         out: dict[str, dict[str, str]] = {}
         prev = previous_summary or {}
         used_themes: set[str] = set()
 
-        for theme_key, msgs in grouped.items():
-            text = _messages_to_text(msgs)
-            keywords = _parse_keywords(theme_key)
-
-            if not text.strip():
-                theme_name = theme_key.strip()
-                summary_text = prev.get(theme_name, "")
-                out[theme_name] = {"theme": theme_name, "summary": summary_text}
-                used_themes.add(theme_name)
-                continue
-
-            # 1️⃣ Черновая тема по keywords
-            draft_theme = (
-                    self._theme_chain.invoke(
-                        {"keywords": ", ".join(keywords)}
-                    ).strip()
-                    or theme_key.strip()
-            )
+        match: Callable[[str, str], str | None] = (
+            matcher.match if matcher is not None else (lambda title, _summary: title if title in prev else None)
+        )
 
-            # 2️⃣ Summary через граф
-            summary = self._graph.invoke(
-                {
-                    "theme": draft_theme,
-                    "keywords": keywords,
-                    "text": text,
-                    "round": 0,
-                }
-            )["text"]
-
-            summary_text = str(summary).strip()
-
-            # 3️⃣ Update с предыдущей сводкой
-            prev_text = prev.get(draft_theme)
-            if prev_text:
-                if summary_text:
-                    summary_text = self._update_chain.invoke(
-                        {
-                            "theme": draft_theme,
-                            "previous_summary": prev_text,
-                            "summary": summary_text,
-                        }
-                    ).strip()
-                else:
-                    summary_text = prev_text
-
-            final_theme = (
-                    self._refine_theme_chain.invoke(
-                        {
-                            "keywords": ", ".join(keywords),
-                            "summary": summary_text,
-                        }
-                    ).strip()
-                    or draft_theme
-            )
+        items = list(grouped.items())
+        workers = max(1, min(int(max_concurrency or self.theme_concurrency), len(items) or 1))
+
+        progress_lock = threading.Lock()
+        completed = 0
+
+        def run(item: tuple[str, list[Message]]) -> tuple[str, str, str | None]:
+            nonlocal completed
+            check(cancel)
+            result = self._summarize_theme(item[0], item[1], prev, fused, match, cancel)
+            if on_theme is not None:
+                on_theme(result[0], result[1])
+            if progress is not None:
+                with progress_lock:
+                    completed += 1
+                    progress("summarizing", completed, len(items))
+            return result
+
+        if progress is not None:
+            progress("summarizing", 0, len(items))
+        if workers == 1:
+            results = [run(item) for item in items]
+        else:
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="summary-theme") as pool:
+                results = list(pool.map(run, items))
 
-            out[final_theme] = {
-                "theme": final_theme,
+        for theme_name, summary_text, matched in results:
+            out[theme_name] = {
+                "theme": theme_name,
                 "summary": summary_text,
             }
-            used_themes.add(final_theme)
+            used_themes.add(theme_name)
+            if matched:
+                # the previous theme was merged into this one, don't carry it along verbatim
+                used_themes.add(matched)
 
         for theme_name, summary_text in prev.items():
             if theme_name in used_themes:
@@ -221,32 +395,240 @@ class SummaryBuilder:
 
         return out
 
+    def _summarize_theme(
+            self,
+            theme_key: str,
+            msgs: list[Message],
+            prev: dict[str, str],
+            fused: bool,
+            match: Callable[[str, str], str | None],
+            cancel: CancellationToken | None = None,
+    ) -> tuple[str, str, str | None]:
+        """
+        Run the full pipeline for one theme.
+
+        Returns (final_theme, summary_text, matched previous theme or None).
+        """
+        text = _messages_to_text(msgs)
+        keywords = _parse_keywords(theme_key)
+
+        if not text.strip():
+            theme_name = theme_key.strip()
+            return theme_name, prev.get(theme_name, ""), None
+
+        if fused and self._count_tokens(text) <= self.per_chunk_target_tokens:
+            result = self._summarize_theme_fused(theme_key, keywords, text, prev, match, cancel)
+            if result is not None:
+                return result
+
+        # 1️⃣ Черновая тема по keywords
+        check(cancel)
+        draft_theme = self._draft_theme(theme_key, keywords)
+
+        # 2️⃣ Summary через граф
+        summary = self._graph.invoke(
+            {
+                "theme": draft_theme,
+                "keywords": keywords,
+                "messages": msgs,
+                "text": text,
+                "parts": [],
+                "round": 0,
+                "cancel": cancel,
+            }
+        )["text"]
+
+        summary_text = str(summary).strip()
+
+        # 3️⃣ Update с предыдущей сводкой (мэтчинг темы)
+        matched = match(draft_theme, summary_text)
+        prev_text = prev.get(matched) if matched else None
+        if prev_text:
+            if summary_text:
+                check(cancel)
+                summary_text = self._update_chain.invoke(
+                    {
+                        "theme": draft_theme,
+                        "previous_summary": prev_text,
+                        "summary": summary_text,
+                    }
+                ).strip()
+            else:
+                summary_text = prev_text
+
+        check(cancel)
+        final_theme = (
+                self._refine_theme_chain.invoke(
+                    {
+                        "keywords": ", ".join(keywords),
+                        "summary": summary_text,
+                    }
+                ).strip()
+                or draft_theme
+        )
+
+        return final_theme, summary_text, matched
+
+    def _draft_theme(self, theme_key: str, keywords: list[str]) -> str:
+        """Draft title from keywords; a keyword set seen before is answered from the title memo."""
+        if self.title_memo is not None:
+            memo = self.title_memo.get(self.model, keywords)
+            if memo:
+                return memo
+
+        draft_theme = (
+                self._theme_chain.invoke(
+                    {"keywords": ", ".join(keywords)}
+                ).strip()
+                or theme_key.strip()
+        )
+        if self.title_memo is not None:
+            self.title_memo.set(self.model, keywords, draft_theme)
+        return draft_theme
+
+    def _summarize_theme_fused(
+            self,
+            theme_key: str,
+            keywords: list[str],
+            text: str,
+            prev: dict[str, str],
+            match: Callable[[str, str], str | None],
+            cancel: CancellationToken | None = None,
+    ) -> tuple[str, str, str | None] | None:
+        """
+        Fused path for small themes: one call for title + summary, one more to merge
+        with the previous summary of the matched theme.
+
+        Returns None when the first answer has no usable summary (e.g. cut off), so
+        the caller falls back to the regular pipeline.
+        """
+        check(cancel)
+        title, summary_text = _parse_fused_output(
+            self._fused_summary_chain.invoke({"keywords": ", ".join(keywords), "chunk": text}),
+            fallback_title=theme_key.strip(),
+        )
+
+        if not summary_text:
+            return None
+
+        matched = match(title, summary_text)
+        prev_text = prev.get(matched) if matched else None
+        if prev_text:
+            check(cancel)
+            draft = summary_text
+            title, summary_text = _parse_fused_output(
+                self._fused_update_chain.invoke(
+                    {
+                        "keywords": ", ".join(keywords),
+                        "theme": title,
+                        "previous_summary": prev_text,
+                        "summary": summary_text,
+                    }
+                ),
+                fallback_title=title,
+            )
+            # a broken merge answer must not drop the new messages: keep the unmerged draft
+            summary_text = summary_text or draft
+
+        return title, summary_text, matched
+
+    def _batch(self, chain, inputs: list[dict], cancel: CancellationToken | None) -> list[str]:
+        """
+        `chain.batch` with up to map_concurrency calls in flight. With a cancellation
+        token the batch runs in waves of map_concurrency and the token is checked
+        between waves.
+        """
+        step = self.map_concurrency
+        if cancel is None:
+            return chain.batch(inputs, config={"max_concurrency": step})
+
+        out: list[str] = []
+        for start in range(0, len(inputs), step):
+            cancel.raise_if_cancelled()
+            out.extend(chain.batch(inputs[start:start + step], config={"max_concurrency": step}))
+        return out
+
     def _build_graph(self):
         class State(dict):  # type: ignore
             theme: str
             keywords: list[str]
+            messages: list[Message]
             text: str
+            parts: list[str]
             round: int
+            cancel: CancellationToken | None
 
         def chunk_and_summarize(state: State) -> State:
-            chunks = _chunk_by_tokens(state["text"], self._count_tokens, self.per_chunk_target_tokens)
+            check(state.get("cancel"))
+            chunks = _chunk_messages(state["messages"], self._count_tokens, self.per_chunk_target_tokens)
             if not chunks:
                 state["text"] = ""
+                state["parts"] = []
                 state["round"] += 1
                 return state
 
-            summaries: list[str] = []
-            for ch in chunks:
-                s = self._summarize_chain.invoke({"theme": state["theme"], "chunk": ch}).strip()
-                summaries.append(s)
+            # chunks already summarized in an earlier request are taken from the store
+            summaries: list[str | None] = [None] * len(chunks)
+            if self.chunk_store is not None:
+                for i, ch in enumerate(chunks):
+                    if ch.key is not None:
+                        summaries[i] = self.chunk_store.get_chunk(self.model, self.temperature, state["theme"], ch.key)
+
+            # map: remaining chunks are independent, run them as one bounded-concurrency batch
+            missing = [i for i, s in enumerate(summaries) if s is None]
+            if missing:
+                fresh = self._batch(
+                    self._summarize_chain,
+                    [{"theme": state["theme"], "chunk": chunks[i].text} for i in missing],
+                    state.get("cancel"),
+                )
+                for i, s in zip(missing, fresh):
+                    summaries[i] = s.strip()
+                    if self.chunk_store is not None and chunks[i].key is not None:
+                        self.chunk_store.set_chunk(
+                            self.model, self.temperature, state["theme"], chunks[i].key, summaries[i]
+                        )
 
             state["text"] = "\n\n".join(summaries)
+            state["parts"] = summaries
             state["round"] += 1
             return state
 
         def reduce_once(state: State) -> State:
+            check(state.get("cancel"))
             reduced = self._reduce_chain.invoke({"theme": state["theme"], "summaries": state["text"]}).strip()
             state["text"] = reduced
+            state["parts"] = [reduced]
+            state["round"] += 1
+            return state
+
+        def reduce_tree(state: State) -> State:
+            # one tree level: window-sized batches of partial summaries are reduced in parallel
+            check(state.get("cancel"))
+            batches = _balanced_batches(state["parts"], self._count_tokens, self.effective_window_tokens)
+
+            reduced: list[str | None] = [None] * len(batches)
+            if self.chunk_store is not None:
+                reduced = [
+                    self.chunk_store.get_reduce(self.model, self.temperature, state["theme"], b) for b in batches
+                ]
+
+            missing = [i for i, r in enumerate(reduced) if r is None]
+            if missing:
+                fresh = self._batch(
+                    self._reduce_chain,
+                    [{"theme": state["theme"], "summaries": "\n\n".join(batches[i])} for i in missing],
+                    state.get("cancel"),
+                )
+                for i, r in zip(missing, fresh):
+                    reduced[i] = r.strip()
+                    if self.chunk_store is not None:
+                        self.chunk_store.set_reduce(
+                            self.model, self.temperature, state["theme"], batches[i], reduced[i]
+                        )
+
+            state["parts"] = reduced
+            state["text"] = "\n\n".join(state["parts"])
             state["round"] += 1
             return state
 
@@ -257,7 +639,7 @@ class SummaryBuilder:
 
         g = StateGraph(State)
         g.add_node("chunk", chunk_and_summarize)
-        g.add_node("reduce", reduce_once)
+        g.add_node("reduce", reduce_tree if self.reduce_mode == "tree" else reduce_once)
 
         g.set_entry_point("chunk")
         g.add_conditional_edges("chunk", route, {"reduce": "reduce", "done": END})
@@ -0,0 +1,102 @@
+import threading
+from typing import Callable
+
+import numpy as np
+
+
+def _theme_doc(title: str, summary: str) -> str:
+    return f"{title.strip()}\n{summary.strip()}"
+
+
+def theme_vectors(
+        themes: dict[str, str],
+        embed: Callable[[list[str]], np.ndarray],
+        known: dict[str, np.ndarray] | None = None,
+) -> dict[str, np.ndarray]:
+    """Title + summary embedding per theme; themes present in `known` are not re-encoded."""
+    known = known or {}
+    out = {name: known[name] for name in themes if name in known}
+    missing = [name for name in themes if name not in out]
+    if missing:
+        fresh = np.asarray(embed([_theme_doc(n, str(themes[n])) for n in missing]), dtype=np.float32)
+        out.update(zip(missing, fresh))
+    return {name: out[name] for name in themes}
+
+
+class ThemeIndex:
+    """
+    Minimal in-memory vector index: one normalized row per theme, cosine search
+    as a single matrix-vector product.
+    """
+
+    def __init__(self, names: list[str], vectors: np.ndarray):
+        self.names = list(names)
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if not self.names:
+            # reshape(0, -1) is ambiguous for an empty array; keep the dimension if known
+            dim = vectors.shape[-1] if vectors.ndim == 2 else 0
+            self.vectors = np.zeros((0, dim), dtype=np.float32)
+        else:
+            self.vectors = vectors.reshape(len(self.names), -1)
+
+    def search(self, vector: np.ndarray, exclude: set[str] | None = None) -> tuple[str, float] | None:
+        if not self.names:
+            return None
+        sims = self.vectors @ np.asarray(vector, dtype=np.float32)
+        if exclude:
+            for i, name in enumerate(self.names):
+                if name in exclude:
+                    sims[i] = -np.inf
+        best = int(np.argmax(sims))
+        if not np.isfinite(sims[best]):
+            return None
+        return self.names[best], float(sims[best])
+
+
+class ThemeMatcher:
+    """
+    Matches new themes to themes from `previous_summary` (README step 4).
+
+    Exact title match wins; otherwise title + summary of the new theme is embedded and
+    compared with title + summary of every previous theme. A previous theme is matched
+    at most once per request; `match` is thread-safe for concurrent theme workers.
+
+    Embeddings of previous themes go through `embed`, so with the embedding store
+    attached unchanged themes are not re-encoded across requests. `vectors` can
+    supply them directly (e.g. centroids kept in an agent session).
+    """
+
+    def __init__(
+            self,
+            previous: dict[str, str],
+            embed: Callable[[list[str]], np.ndarray],
+            threshold: float = 0.9,
+            vectors: dict[str, np.ndarray] | None = None,
+    ):
+        self.previous = dict(previous)
+        self.embed = embed
+        self.threshold = float(threshold)
+        self._lock = threading.Lock()
+        self._claimed: set[str] = set()
+
+        names = list(self.previous)
+        known = theme_vectors(self.previous, embed, vectors)
+        self.index = ThemeIndex(names, np.stack([known[n] for n in names]) if names else np.zeros((0, 0), dtype=np.float32))
+
+    def match(self, title: str, summary: str) -> str | None:
+        """Return the name of the matching previous theme (and claim it), or None."""
+        with self._lock:
+            if title in self.previous and title not in self._claimed:
+                self._claimed.add(title)
+                return title
+
+        if not self.index.names:
+            return None
+        vector = np.asarray(self.embed([_theme_doc(title, summary)]), dtype=np.float32)[0]
+
+        with self._lock:
+            found = self.index.search(vector, exclude=self._claimed)
+            if found is None or found[1] < self.threshold:
+                return None
+            self._claimed.add(found[0])
+            return found[0]
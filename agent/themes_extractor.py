@@ -1,9 +1,35 @@
 from bertopic import BERTopic  
 
+from collections import Counter
+from dataclasses import dataclass, field, replace
 from typing import Any
 
-from agent import Message
+import numpy as np
+
+from agent import Message, ProgressCallback
+from agent.cancellation import CancellationToken, Cancelled, check
+from agent.clustering import CLUSTERING_BACKENDS, cluster_embeddings, ctfidf_keywords
+from agent.dedup import exact_duplicate_units, near_duplicate_leaders, near_duplicate_texts
 from agent.embedder import E5Embedder
+from agent.registry import registry
+
+
+def message_to_doc(msg: Message) -> str:
+    """Document string embedded for a message; also the embedding store key."""
+    return f"{msg.user} [{msg.type}]: {msg.text}".strip()
+
+
+@dataclass
+class _StreamTopic:
+    """Topic merged across windows: running centroid, keyword weights and member messages."""
+    centroid_sum: np.ndarray
+    count: int = 0
+    windows: int = 0
+    keywords: Counter = field(default_factory=Counter)
+    messages: list[Message] = field(default_factory=list)
+
+    def centroid(self) -> np.ndarray:
+        return self.centroid_sum / max(float(np.linalg.norm(self.centroid_sum)), 1e-12)
 
 
 class ThemesExtractor:
@@ -13,76 +39,340 @@ class ThemesExtractor:
         embedding_model: str = "intfloat/multilingual-e5-small",
         device: str = "cpu",
         include_noise: bool = True,
+        embedder: E5Embedder | None = None,
+        dedup: bool = False,
+        near_duplicate_threshold: float = 1.0,
+        clustering: str = "bertopic",
+        window_size: int = 0,
+        window_merge_threshold: float = 0.8,
+        progress: ProgressCallback | None = None,
+        cancel: CancellationToken | None = None,
     ):
         self.min_topic_size = int(min_topic_size)
         self.include_noise = bool(include_noise)
+        self.dedup = bool(dedup)
+        self.near_duplicate_threshold = float(near_duplicate_threshold)
+        if clustering not in CLUSTERING_BACKENDS:
+            raise ValueError(f"Unknown clustering backend: {clustering!r}")
+        self.clustering = clustering
+        self.window_size = max(0, int(window_size))
+        self.window_merge_threshold = float(window_merge_threshold)
+        self.progress = progress
+        self.cancel = cancel
 
-        self._embedder = E5Embedder(model_name=embedding_model, device=device)
+        self._embedder = embedder or registry.get_embedder(embedding_model, device)
         self.last_result: dict[str, Any] | None = None
+        # keyed by message_to_doc: copies made by _representative share their doc
+        self._embeddings_by_doc: dict[str, np.ndarray] = {}
 
     def __call__(self, messages: list[Message]) -> dict[str, list[Message]]:
         docs = [self._message_to_doc(m) for m in messages if m.text.strip()]
         idx_map = [i for i, m in enumerate(messages) if m.text.strip()]
+        self._embeddings_by_doc = {}
 
         if not docs:
             self.last_result = {"themes": [], "msg_topics": [], "topic_info": []}
             return {}
 
-        if len(docs) < max(2, self.min_topic_size):
-            grouped = {}
-            if self.include_noise:
-                grouped = {"misc": [messages[i] for i in idx_map]}
-            self.last_result = {
-                "themes": self._themes_from_mapping(grouped),
-                "msg_topics": [-1] * len(docs),
-                "topic_info": [],
-            }
-            return grouped
-
-        topic_model = BERTopic(
-            embedding_model=self._embedder,
-            language="multilingual",
-            min_topic_size=self.min_topic_size,
-            nr_topics=None,
-            calculate_probabilities=False,
-            verbose=False,
-        )
+        if self.window_size and len(docs) > self.window_size:
+            return self._call_windowed(messages, docs, idx_map)
+
+        # unit = group of duplicate docs that is embedded, clustered and summarized once
+        if self.dedup:
+            units = exact_duplicate_units([messages[i] for i in idx_map])
+        else:
+            units = [[j] for j in range(len(docs))]
+
+        if len(units) < max(2, self.min_topic_size):
+            return self._fallback(messages, idx_map, units)
 
         try:
-            msg_topics, _ = topic_model.fit_transform(docs)
+            self._report("embedding", 0, 1)
+            embeddings = np.asarray(
+                self._embedder.embed_documents([docs[u[0]] for u in units]),
+                dtype=np.float32,
+            )
+            if self.dedup and self.near_duplicate_threshold < 1.0:
+                units, embeddings = self._merge_near_duplicates(units, embeddings, [messages[i] for i in idx_map])
+            self._report("clustering", 0, 1)
+            unit_topics, topic_id_to_name, topic_info = self._fit_topics([docs[u[0]] for u in units], embeddings)
+        except Cancelled:
+            raise
         except Exception:
-            grouped = {}
-            if self.include_noise:
-                grouped = {"misc": [messages[i] for i in idx_map]}
-            self.last_result = {
-                "themes": self._themes_from_mapping(grouped),
-                "msg_topics": [-1] * len(docs),
-                "topic_info": [],
-            }
-            return grouped
-
-        topic_id_to_name = self._topic_id_to_name(topic_model)
+            return self._fallback(messages, idx_map, units)
+
         grouped: dict[str, list[Message]] = {}
+        msg_topics = [-1] * len(docs)
+
+        for unit, topic_id, vec in zip(units, unit_topics, embeddings):
+            representative = self._representative(messages, idx_map, unit)
+            for j in unit:
+                msg_topics[j] = int(topic_id)
+            self._embeddings_by_doc[docs[unit[0]]] = vec
 
-        for local_i, topic_id in enumerate(msg_topics):
-            global_i = idx_map[local_i]
             name = topic_id_to_name.get(int(topic_id), "misc")
             if (name == "misc") and (not self.include_noise):
                 continue
-            grouped.setdefault(name, []).append(messages[global_i])
+            grouped.setdefault(name, []).append(representative)
 
         themes = self._themes_from_mapping(grouped)
 
         self.last_result = {
             "themes": themes,
             "msg_topics": msg_topics,
-            "topic_info": topic_model.get_topic_info().to_dict(orient="records"),
+            "topic_info": topic_info,
+            "unique_docs": len(units),
         }
         return grouped
 
+    def _call_windowed(self, messages: list[Message], docs: list[str], idx_map: list[int]) -> dict[str, list[Message]]:
+        """
+        Streaming mode for long histories: cluster fixed-size windows one at a time and
+        merge each window's topics into global topics by centroid cosine similarity.
+
+        Only one window of embeddings is alive at a time; across windows the state is
+        one centroid and a capped keyword counter per topic, plus the message
+        references that make up the result. Per-message embeddings are not kept
+        (embeddings_for re-reads them, from the embedding store when it is attached).
+        """
+        topics: list[_StreamTopic] = []
+        noise: list[Message] = []
+        msg_topics = [-1] * len(docs)
+        unique_docs = 0
+
+        bounds = list(range(0, len(docs), self.window_size)) + [len(docs)]
+        if len(bounds) > 2 and bounds[-1] - bounds[-2] < self.window_size // 2:
+            del bounds[-2]  # fold a short tail into the previous window
+
+        windows = len(bounds) - 1
+        for window, (start, end) in enumerate(zip(bounds, bounds[1:])):
+            self._report("clustering", window, windows)
+            w_idx = idx_map[start:end]
+            w_docs = docs[start:end]
+            if self.dedup:
+                units = exact_duplicate_units([messages[i] for i in w_idx])
+            else:
+                units = [[j] for j in range(len(w_docs))]
+            unique_docs += len(units)
+
+            unit_topics = [-1] * len(units)
+            mapping: dict[int, str] = {-1: "misc"}
+            embeddings = None
+            if len(units) >= max(2, self.min_topic_size):
+                try:
+                    embeddings = np.asarray(
+                        self._embedder.embed_documents([w_docs[u[0]] for u in units]),
+                        dtype=np.float32,
+                    )
+                    if self.dedup and self.near_duplicate_threshold < 1.0:
+                        units, embeddings = self._merge_near_duplicates(
+                            units, embeddings, [messages[i] for i in w_idx]
+                        )
+                    unit_topics, mapping, _ = self._fit_topics([w_docs[u[0]] for u in units], embeddings)
+                except Cancelled:
+                    raise
+                except Exception:
+                    unit_topics = [-1] * len(units)
+
+            local_to_global = self._merge_window_topics(topics, units, unit_topics, mapping, embeddings)
+
+            for unit, topic_id in zip(units, unit_topics):
+                representative = self._representative(messages, w_idx, unit)
+                global_id = local_to_global.get(int(topic_id), -1)
+                for j in unit:
+                    msg_topics[start + j] = global_id
+                if global_id == -1:
+                    noise.append(representative)
+                else:
+                    topics[global_id].messages.append(representative)
+
+        # final topic ids: by decreasing size, like BERTopic
+        order = sorted(range(len(topics)), key=lambda t: -topics[t].count)
+        renumber = {old: new for new, old in enumerate(order)}
+        msg_topics = [renumber.get(t, -1) for t in msg_topics]
+
+        grouped: dict[str, list[Message]] = {}
+        topic_info = []
+        for old in order:
+            topic = topics[old]
+            keywords = [w for w, _ in topic.keywords.most_common(8)]
+            name = self._name_from_keywords(keywords)
+            grouped.setdefault(name, []).extend(topic.messages)
+            topic_info.append(
+                {
+                    "Topic": renumber[old],
+                    "Count": topic.count,
+                    "Name": name,
+                    "Representation": keywords,
+                    "Windows": topic.windows,
+                }
+            )
+        if noise:
+            topic_info.insert(0, {"Topic": -1, "Count": len(noise), "Name": "misc", "Representation": [], "Windows": 0})
+            if self.include_noise:
+                grouped.setdefault("misc", []).extend(noise)
+
+        self.last_result = {
+            "themes": self._themes_from_mapping(grouped),
+            "msg_topics": msg_topics,
+            "topic_info": topic_info,
+            "unique_docs": unique_docs,
+            "windows": windows,
+        }
+        return grouped
+
+    def _report(self, stage: str, done: int, total: int) -> None:
+        """Report progress; every stage boundary is also a cancellation point."""
+        check(self.cancel)
+        if self.progress is not None:
+            self.progress(stage, done, total)
+
+    def _merge_window_topics(
+        self,
+        topics: list[_StreamTopic],
+        units: list[list[int]],
+        unit_topics: list[int],
+        mapping: dict[int, str],
+        embeddings: np.ndarray | None,
+    ) -> dict[int, int]:
+        """Attach each local topic of a window to the closest global topic (or a new one)."""
+        local_to_global: dict[int, int] = {}
+        if embeddings is None:
+            return local_to_global
+
+        labels = np.asarray([int(t) for t in unit_topics])
+        sizes = np.asarray([len(u) for u in units])
+        # centroids of existing topics are frozen for the window, so two local topics can share a target
+        existing = np.stack([t.centroid() for t in topics]) if topics else None
+
+        for local in sorted(set(labels.tolist()) - {-1}):
+            rows = labels == local
+            centroid_sum = embeddings[rows].sum(axis=0)
+            centroid = centroid_sum / max(float(np.linalg.norm(centroid_sum)), 1e-12)
+
+            target = -1
+            if existing is not None:
+                sims = existing @ centroid
+                best = int(np.argmax(sims))
+                if sims[best] >= self.window_merge_threshold:
+                    target = best
+            if target == -1:
+                topics.append(_StreamTopic(centroid_sum=np.zeros_like(centroid)))
+                target = len(topics) - 1
+
+            topic = topics[target]
+            count = int(sizes[rows].sum())
+            topic.centroid_sum += centroid_sum
+            topic.count += count
+            topic.windows += 1
+            keywords = self._keywords_from_name(mapping.get(local, ""))
+            for rank, word in enumerate(keywords):
+                topic.keywords[word] += count * (len(keywords) - rank) / len(keywords)
+            if len(topic.keywords) > 64:
+                topic.keywords = Counter(dict(topic.keywords.most_common(32)))
+            local_to_global[local] = target
+
+        return local_to_global
+
+    def _fit_topics(
+        self,
+        docs: list[str],
+        embeddings: np.ndarray,
+    ) -> tuple[list[int], dict[int, str], list[dict[str, Any]]]:
+        """Cluster docs with the configured backend -> (topic per doc, topic id -> name, topic info)."""
+        if self.clustering == "bertopic":
+            topic_model = BERTopic(
+                embedding_model=self._embedder,
+                language="multilingual",
+                min_topic_size=self.min_topic_size,
+                nr_topics=None,
+                calculate_probabilities=False,
+                verbose=False,
+            )
+            topics, _ = topic_model.fit_transform(docs, embeddings=embeddings)
+            return (
+                list(topics),
+                self._topic_id_to_name(topic_model),
+                topic_model.get_topic_info().to_dict(orient="records"),
+            )
+
+        labels = cluster_embeddings(embeddings, self.clustering, self.min_topic_size)
+        keywords = ctfidf_keywords(docs, labels)
+        mapping: dict[int, str] = {-1: "misc"}
+        mapping.update({t: self._name_from_keywords(kw) for t, kw in keywords.items()})
+
+        counts = Counter(int(t) for t in labels)
+        topic_info = [
+            {"Topic": t, "Count": counts[t], "Name": mapping.get(t, "misc"), "Representation": keywords.get(t, [])}
+            for t in sorted(counts)
+        ]
+        return [int(t) for t in labels], mapping, topic_info
+
+    def _fallback(self, messages: list[Message], idx_map: list[int], units: list[list[int]]) -> dict[str, list[Message]]:
+        grouped = {}
+        if self.include_noise:
+            grouped = {"misc": [self._representative(messages, idx_map, u) for u in units]}
+        self.last_result = {
+            "themes": self._themes_from_mapping(grouped),
+            "msg_topics": [-1] * len(idx_map),
+            "topic_info": [],
+            "unique_docs": len(units),
+        }
+        return grouped
+
+    def _merge_near_duplicates(
+        self,
+        units: list[list[int]],
+        embeddings: np.ndarray,
+        doc_messages: list[Message],
+    ) -> tuple[list[list[int]], np.ndarray]:
+        """
+        Merge units whose embeddings are near-duplicates. The merged text never reaches
+        the LLM, so a unit joins its leader only if it comes from the same user and
+        its text is nearly identical too; E5 scores short different replies
+        ("да" / "нет") close to 1.
+        """
+        leaders = near_duplicate_leaders(
+            embeddings,
+            self.near_duplicate_threshold,
+            accept=lambda row, leader: near_duplicate_texts(
+                doc_messages[units[leader][0]],
+                doc_messages[units[row][0]],
+            ),
+        )
+        merged: dict[int, list[int]] = {}
+        for unit, leader in zip(units, leaders):
+            merged.setdefault(leader, []).extend(unit)
+        rows = list(merged.keys())
+        return [sorted(merged[r]) for r in rows], embeddings[rows]
+
+    @staticmethod
+    def _representative(messages: list[Message], idx_map: list[int], unit: list[int]) -> Message:
+        """First message of the unit, weighted by the number of collapsed copies."""
+        first = messages[idx_map[unit[0]]]
+        if len(unit) == 1:
+            return first
+        return replace(first, weight=sum(messages[idx_map[j]].weight for j in unit))
+
+    def embeddings_for(self, messages: list[Message]) -> np.ndarray:
+        """
+        Normalized E5 embeddings for `messages` (rows in the same order).
+
+        Vectors computed by the last __call__ are reused; other messages are embedded now.
+        """
+        docs = [self._message_to_doc(m) for m in messages]
+        missing = list(dict.fromkeys(d for d in docs if d not in self._embeddings_by_doc))
+        if missing:
+            fresh = self._embedder.embed_documents(missing)
+            for doc, vec in zip(missing, fresh):
+                self._embeddings_by_doc[doc] = np.asarray(vec, dtype=np.float32)
+        if not messages:
+            return np.zeros((0, 0), dtype=np.float32)
+        return np.stack([self._embeddings_by_doc[d] for d in docs])
+
     @staticmethod
     def _message_to_doc(msg: Message) -> str:
-        return f"{msg.user} [{msg.type}]: {msg.text}".strip()
+        return message_to_doc(msg)
 
     def _topic_id_to_name(self, topic_model) -> dict[int, str]:
         info = topic_model.get_topic_info()
@@ -103,8 +393,14 @@ class ThemesExtractor:
             return "no keywords"
         return "\n\n\n".join(keywords)
 
+    @staticmethod
+    def _keywords_from_name(name: str) -> list[str]:
+        if name in ("", "misc", "no keywords"):
+            return []
+        return [w.strip() for w in name.split("\n\n\n") if w.strip()]
+
     @staticmethod
     def _themes_from_mapping(grouped: dict[str, list[Message]]) -> list[dict[str, Any]]:
-        items = [{"name": name, "count": len(msgs)} for name, msgs in grouped.items()]
+        items = [{"name": name, "count": sum(m.weight for m in msgs)} for name, msgs in grouped.items()]
         items.sort(key=lambda x: x["count"], reverse=True)
         return items
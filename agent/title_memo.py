@@ -0,0 +1,46 @@
+import hashlib
+import threading
+
+from agent.llm_cache import CacheBackend
+
+
+def normalize_keywords(keywords: list[str]) -> list[str]:
+    """Lowercased, stripped, de-duplicated and sorted keywords: the identity of a topic."""
+    return sorted({" ".join(k.lower().split()) for k in keywords if k.strip()})
+
+
+class ThemeTitleMemo:
+    """
+    Persistent map of keyword set -> draft theme title.
+
+    In an active chat the same topic comes back from the extractor with the same
+    keywords (possibly reordered), so its draft title is taken from here instead
+    of calling the theme chain again. Eviction (LRU / TTL) is up to the backend.
+    """
+
+    def __init__(self, backend: CacheBackend):
+        self.backend = backend
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(model: str, keywords: list[str]) -> str:
+        identity = "\x00".join(normalize_keywords(keywords))
+        return hashlib.sha256(f"{model}\ntitle\n{identity}".encode("utf-8")).hexdigest()
+
+    def get(self, model: str, keywords: list[str]) -> str | None:
+        value = self.backend.get(self._key(model, keywords))
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def set(self, model: str, keywords: list[str], title: str) -> None:
+        if title.strip():
+            self.backend.set(self._key(model, keywords), title.strip())
+
+    def stats(self) -> dict[str, int | str]:
+        return {"backend": type(self.backend).__name__, "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,104 @@
+import hashlib
+import logging
+import os
+import threading
+from collections import OrderedDict
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+# Ollama model family -> Hugging Face repo with the same tokenizer
+_OLLAMA_TOKENIZERS: dict[str, str] = {
+    "qwen2.5": "Qwen/Qwen2.5-0.5B-Instruct",
+    "qwen2": "Qwen/Qwen2-0.5B-Instruct",
+    "qwen3": "Qwen/Qwen3-0.6B",
+}
+
+SUMMARY_TOKENIZER = os.getenv("SUMMARY_TOKENIZER")
+TOKENIZER_LOCAL_FILES_ONLY = os.getenv("TOKENIZER_LOCAL_FILES_ONLY", "false").strip().lower() in {"1", "true", "yes", "y", "on"}
+
+
+def _tokenizer_name(model: str) -> str | None:
+    if SUMMARY_TOKENIZER:
+        return SUMMARY_TOKENIZER
+    family = model.split(":", 1)[0].lower()
+    return _OLLAMA_TOKENIZERS.get(family)
+
+
+def load_tokenizer(model: str) -> Any | None:
+    """
+    Load the Hugging Face tokenizer matching an Ollama model name.
+
+    `SUMMARY_TOKENIZER` overrides the lookup (repo id or local directory).
+    Returns None if the model is unknown or the files cannot be loaded.
+    """
+    name = _tokenizer_name(model)
+    if not name:
+        return None
+    try:
+        from transformers import AutoTokenizer  # type: ignore
+
+        return AutoTokenizer.from_pretrained(name, local_files_only=TOKENIZER_LOCAL_FILES_ONLY)
+    except Exception as exc:
+        logger.warning("Tokenizer %s for model %s unavailable, using char heuristic: %s", name, model, exc)
+        return None
+
+
+class TokenCounter:
+    """
+    Callable token counter with batched encoding and an LRU memo keyed by text hash.
+
+    Without a tokenizer it falls back to ~1 token per 4 characters.
+    Counts are always at least 1.
+    """
+
+    def __init__(self, tokenizer: Any | None = None, memo_size: int = 50000):
+        self.tokenizer = tokenizer
+        self.memo_size = max(1, int(memo_size))
+        self._lock = threading.Lock()
+        self._memo: OrderedDict[bytes, int] = OrderedDict()
+
+    def __call__(self, text: str) -> int:
+        return self.count_many([text])[0]
+
+    def count_many(self, texts: list[str]) -> list[int]:
+        if self.tokenizer is None:
+            return [max(1, len(t) // 4) for t in texts]
+
+        keys = [hashlib.blake2b(t.encode("utf-8"), digest_size=16).digest() for t in texts]
+        out: list[int | None] = [None] * len(texts)
+        with self._lock:
+            for i, k in enumerate(keys):
+                n = self._memo.get(k)
+                if n is not None:
+                    self._memo.move_to_end(k)
+                    out[i] = n
+
+        missing = [i for i, n in enumerate(out) if n is None]
+        if missing:
+            encoded = self.tokenizer([texts[i] for i in missing], add_special_tokens=False)["input_ids"]
+            with self._lock:
+                for i, ids in zip(missing, encoded):
+                    out[i] = max(1, len(ids))
+                    self._memo[keys[i]] = out[i]
+                while len(self._memo) > self.memo_size:
+                    self._memo.popitem(last=False)
+
+        return out  # type: ignore[return-value]
+
+
+_counters: dict[str, TokenCounter] = {}
+_counters_lock = threading.Lock()
+
+
+def get_token_counter(model: str) -> TokenCounter:
+    """Process-wide TokenCounter per Ollama model; the tokenizer is loaded once."""
+    counter = _counters.get(model)
+    if counter is not None:
+        return counter
+    with _counters_lock:
+        counter = _counters.get(model)
+        if counter is None:
+            counter = TokenCounter(load_tokenizer(model))
+            _counters[model] = counter
+        return counter
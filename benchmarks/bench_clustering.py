@@ -0,0 +1,159 @@
+"""
+Compare clustering backends of ThemesExtractor on one chat window.
+
+Embeddings are computed once and shared, so only the clustering + keyword stage is timed.
+Quality is reported as silhouette on the (non-noise) E5 vectors, noise share and
+agreement with BERTopic (adjusted Rand index).
+
+With --window-size N the windowed (streaming) mode is compared with clustering the
+whole window instead: topics, share of the largest topic and ARI against the full run
+for every --merge-thresholds value.
+
+Usage:
+    python -m benchmarks.bench_clustering messages.json [--min-topic-size 10] [--repeat 3]
+    python -m benchmarks.bench_clustering messages.json --window-size 500 [--backend kmeans]
+        [--merge-thresholds 0.8 0.85 0.9 0.95]
+
+messages.json: list of {"user": ..., "type": ..., "text": ...} (the /analyze payload format)
+or {"messages": [...]}.
+"""
+import argparse
+import json
+import time
+import tracemalloc
+
+import numpy as np
+from sklearn.metrics import adjusted_rand_score, silhouette_score
+
+from agent import Message
+from agent.clustering import CLUSTERING_BACKENDS
+from agent.registry import registry
+from agent.themes_extractor import ThemesExtractor, message_to_doc
+
+
+def _load_messages(path: str) -> list[Message]:
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    if isinstance(data, dict):
+        data = data.get("messages", [])
+    return [Message(user=m["user"], type=m.get("type", "text"), text=m["text"]) for m in data]
+
+
+def _run(backend: str, docs: list[str], embeddings: np.ndarray, min_topic_size: int, embedder) -> dict:
+    extractor = ThemesExtractor(min_topic_size=min_topic_size, embedder=embedder, clustering=backend)
+
+    tracemalloc.start()
+    started = time.perf_counter()
+    labels, mapping, _ = extractor._fit_topics(docs, embeddings)
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    labels = np.asarray(labels)
+    clustered = labels != -1
+    silhouette = None
+    if len(set(labels[clustered].tolist())) >= 2:
+        silhouette = float(silhouette_score(embeddings[clustered], labels[clustered], metric="cosine"))
+
+    return {
+        "backend": backend,
+        "seconds": elapsed,
+        "peak_mb": peak / 2 ** 20,
+        "topics": len(set(labels.tolist()) - {-1}),
+        "noise": float((~clustered).mean()),
+        "silhouette": silhouette,
+        "labels": labels,
+    }
+
+
+def _topic_stats(labels: np.ndarray) -> tuple[int, float]:
+    """(number of topics, share of clustered docs in the largest topic)."""
+    clustered = labels[labels != -1]
+    if not len(clustered):
+        return 0, 0.0
+    counts = np.bincount(clustered)
+    return int((counts > 0).sum()), float(counts.max() / len(clustered))
+
+
+def _compare_windowed(
+        messages: list[Message],
+        embedder,
+        backend: str,
+        min_topic_size: int,
+        window_size: int,
+        thresholds: list[float],
+) -> None:
+    full = ThemesExtractor(min_topic_size=min_topic_size, embedder=embedder, clustering=backend)
+    started = time.perf_counter()
+    full(messages)
+    full_seconds = time.perf_counter() - started
+    reference = np.asarray(full.last_result["msg_topics"])
+    topics, largest = _topic_stats(reference)
+
+    print(f"{'mode':<18}{'s':>8}{'topics':>8}{'largest':>9}{'ARI':>7}")
+    print(f"{'full':<18}{full_seconds:>8.2f}{topics:>8}{largest:>9.2f}{1.0:>7.2f}")
+    for threshold in thresholds:
+        extractor = ThemesExtractor(
+            min_topic_size=min_topic_size,
+            embedder=embedder,
+            clustering=backend,
+            window_size=window_size,
+            window_merge_threshold=threshold,
+        )
+        started = time.perf_counter()
+        extractor(messages)
+        seconds = time.perf_counter() - started
+        labels = np.asarray(extractor.last_result["msg_topics"])
+        topics, largest = _topic_stats(labels)
+        ari = adjusted_rand_score(reference, labels)
+        print(f"{f'window merge={threshold:g}':<18}{seconds:>8.2f}{topics:>8}{largest:>9.2f}{ari:>7.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("path")
+    parser.add_argument("--min-topic-size", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--model", default="intfloat/multilingual-e5-small")
+    parser.add_argument("--window-size", type=int, default=0)
+    parser.add_argument("--backend", choices=CLUSTERING_BACKENDS, default="bertopic")
+    parser.add_argument("--merge-thresholds", type=float, nargs="+", default=[0.8, 0.85, 0.9, 0.95])
+    args = parser.parse_args()
+
+    messages = _load_messages(args.path)
+    embedder = registry.get_embedder(args.model, "cpu")
+    if args.window_size:
+        _compare_windowed(
+            messages,
+            embedder,
+            args.backend,
+            args.min_topic_size,
+            args.window_size,
+            args.merge_thresholds,
+        )
+        return
+
+    docs = [message_to_doc(m) for m in messages if m.text.strip()]
+    embeddings = np.asarray(embedder.embed_documents(docs), dtype=np.float32)
+    print(f"docs={len(docs)} dim={embeddings.shape[1]}")
+
+    results = {}
+    for backend in CLUSTERING_BACKENDS:
+        runs = [_run(backend, docs, embeddings, args.min_topic_size, embedder) for _ in range(args.repeat)]
+        best = min(runs, key=lambda r: r["seconds"])
+        best["peak_mb"] = max(r["peak_mb"] for r in runs)
+        results[backend] = best
+
+    reference = results["bertopic"]["labels"]
+    print(f"{'backend':<14}{'best s':>9}{'peak MB':>10}{'topics':>8}{'noise':>8}{'silh.':>8}{'ARI':>7}")
+    for backend, r in results.items():
+        ari = adjusted_rand_score(reference, r["labels"])
+        silhouette = f"{r['silhouette']:.3f}" if r["silhouette"] is not None else "-"
+        print(
+            f"{backend:<14}{r['seconds']:>9.3f}{r['peak_mb']:>10.1f}{r['topics']:>8}"
+            f"{r['noise']:>8.2f}{silhouette:>8}{ari:>7.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
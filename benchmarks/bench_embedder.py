@@ -0,0 +1,92 @@
+"""
+Parity and throughput of the ONNX int8 embedder against the PyTorch one.
+
+Parity: cosine similarity between torch and onnx vectors of the same documents;
+the script exits with status 1 if the minimum falls below --min-cosine.
+Throughput: documents per second for each backend (best of --repeat runs).
+
+Usage:
+    python -m benchmarks.bench_embedder [messages.json] [--n 512] [--min-cosine 0.98]
+    python -m benchmarks.bench_embedder --parity-only   # quick gate: 64 docs, one run each
+
+Without a file, synthetic chat-like documents of mixed length are used.
+"""
+import argparse
+import json
+import random
+import sys
+import time
+
+import numpy as np
+
+from agent.embedder import E5Embedder
+from agent.onnx_embedder import OnnxE5Embedder
+
+_WORDS = (
+    "деплой под кластер ошибка логи python баг релиз тест ревью обед встреча завтра "
+    "kubernetes redis postgres timeout ретрай конфиг докер образ сборка пайплайн"
+).split()
+
+
+def _synthetic_docs(n: int, seed: int = 0) -> list[str]:
+    rng = random.Random(seed)
+    docs = []
+    for i in range(n):
+        length = rng.choice([2, 5, 12, 40, 120])
+        docs.append(f"user{i % 7} [text]: " + " ".join(rng.choice(_WORDS) for _ in range(length)))
+    return docs
+
+
+def _load_docs(path: str) -> list[str]:
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    if isinstance(data, dict):
+        data = data.get("messages", [])
+    return [f"{m['user']} [{m.get('type', 'text')}]: {m['text']}".strip() for m in data if m.get("text", "").strip()]
+
+
+def _throughput(embedder: E5Embedder, docs: list[str], repeat: int) -> tuple[float, np.ndarray]:
+    best, vectors = float("inf"), None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        vectors = embedder._encode(docs)
+        best = min(best, time.perf_counter() - started)
+    return len(docs) / best, np.asarray(vectors, dtype=np.float32)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("path", nargs="?")
+    parser.add_argument("--n", type=int, default=512)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--model", default="intfloat/multilingual-e5-small")
+    parser.add_argument("--min-cosine", type=float, default=0.98)
+    parser.add_argument("--parity-only", action="store_true", help="skip throughput, check parity on 64 docs")
+    args = parser.parse_args()
+    if args.parity_only:
+        args.n = min(args.n, 64)
+        args.repeat = 1
+    docs = _load_docs(args.path)[: args.n] if args.path else _synthetic_docs(args.n)
+
+    torch_embedder = E5Embedder(args.model)
+    onnx_embedder = OnnxE5Embedder(args.model)
+    torch_embedder.warmup()
+    onnx_embedder.warmup()
+
+    torch_rate, torch_vecs = _throughput(torch_embedder, docs, args.repeat)
+    onnx_rate, onnx_vecs = _throughput(onnx_embedder, docs, args.repeat)
+
+    cosine = (torch_vecs * onnx_vecs).sum(axis=1)
+    print(f"docs={len(docs)}")
+    print(f"torch : {torch_rate:8.1f} docs/s  weights={torch_embedder.memory_bytes() / 2 ** 20:.1f} MB")
+    print(f"onnx  : {onnx_rate:8.1f} docs/s  weights={onnx_embedder.memory_bytes() / 2 ** 20:.1f} MB")
+    print(f"speedup x{onnx_rate / torch_rate:.2f}")
+    print(f"cosine parity: min={cosine.min():.4f} mean={cosine.mean():.4f}")
+
+    if cosine.min() < args.min_cosine:
+        print(f"FAIL: min cosine below {args.min_cosine}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
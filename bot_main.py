@@ -3,9 +3,10 @@ import logging
 from aiogram import Bot, Dispatcher
 from db_functions.db import db_init
 from db_functions.checkpoints import checkpoints_init, checkpoints_close
-from config import BOT_TOKEN, LOG_LEVEL
+from config import BOT_TOKEN, EMBED_AT_INGEST, LOG_LEVEL
 from handlers import commands, parser
 from cleaners.db_cleaner import db_periodic_cleaner
+from utils.embed_queue import embed_worker
 
 logging.basicConfig(
     level=LOG_LEVEL,
@@ -28,6 +29,8 @@ async def main():
     dp.include_router(parser.router)
 
     asyncio.create_task(db_periodic_cleaner())
+    if EMBED_AT_INGEST:
+        asyncio.create_task(embed_worker())
 
     logger.info("Bot started")
     try:
@@ -20,6 +20,16 @@ def _int_env(name: str, default: int) -> int:
         return default
 
 
+def _float_env(name: str, default: float) -> float:
+    raw = os.getenv(name)
+    if not raw:
+        return default
+    try:
+        return float(raw)
+    except ValueError:
+        return default
+
+
 def _bool_env(name: str, default: bool) -> bool:
     raw = os.getenv(name)
     if raw is None:
@@ -30,9 +40,30 @@ def _bool_env(name: str, default: bool) -> bool:
 SUMMARY_MAX_MESSAGES = _int_env("SUMMARY_MAX_MESSAGES", 1000)
 SUMMARY_MIN_TOPIC_SIZE = _int_env("SUMMARY_MIN_TOPIC_SIZE", 10)
 SUMMARY_INCLUDE_NOISE = _bool_env("SUMMARY_INCLUDE_NOISE", True)
+SUMMARY_CLUSTERING = os.getenv("SUMMARY_CLUSTERING", "bertopic")
+SUMMARY_WINDOW_SIZE = _int_env("SUMMARY_WINDOW_SIZE", 0)
+SUMMARY_WINDOW_MERGE_THRESHOLD = _float_env("SUMMARY_WINDOW_MERGE_THRESHOLD", 0.8)
 SUMMARY_OLLAMA_MODEL = os.getenv("SUMMARY_OLLAMA_MODEL", "qwen2.5:1.5b-instruct")
 SUMMARY_CONTEXT_WINDOW_TOKENS = _int_env("SUMMARY_CONTEXT_WINDOW_TOKENS", 4096)
 SUMMARY_AGENT_TIMEOUT_SECONDS = _int_env("SUMMARY_AGENT_TIMEOUT_SECONDS", 0)
+SUMMARY_AGENT_SESSIONS = _bool_env("SUMMARY_AGENT_SESSIONS", True)
+SUMMARY_AGENT_MODE = os.getenv("SUMMARY_AGENT_MODE", "stream").strip().lower()  # stream | jobs | sync
+SUMMARY_POLL_INTERVAL_SECONDS = _int_env("SUMMARY_POLL_INTERVAL_SECONDS", 2)
+SUMMARY_COALESCE = _bool_env("SUMMARY_COALESCE", True)
+SUMMARY_COALESCE_LOCK_SECONDS = _int_env("SUMMARY_COALESCE_LOCK_SECONDS", 900)
+SUMMARY_COALESCE_RESULT_SECONDS = _int_env("SUMMARY_COALESCE_RESULT_SECONDS", 300)
+SUMMARY_THEME_CONCURRENCY = _int_env("SUMMARY_THEME_CONCURRENCY", 1)
+SUMMARY_MAP_CONCURRENCY = _int_env("SUMMARY_MAP_CONCURRENCY", 1)
+SUMMARY_FUSED = _bool_env("SUMMARY_FUSED", False)
+SUMMARY_DEDUP = _bool_env("SUMMARY_DEDUP", False)
+SUMMARY_EXTRACTIVE = _bool_env("SUMMARY_EXTRACTIVE", False)
+SUMMARY_EXTRACTIVE_BUDGET_TOKENS = _int_env("SUMMARY_EXTRACTIVE_BUDGET_TOKENS", 0)
+
+# ingest-time embedding (agent /embed)
+EMBED_AT_INGEST = _bool_env("EMBED_AT_INGEST", True)
+EMBED_BATCH_SIZE = _int_env("EMBED_BATCH_SIZE", 32)
+EMBED_FLUSH_SECONDS = _int_env("EMBED_FLUSH_SECONDS", 2)
+EMBED_QUEUE_SIZE = _int_env("EMBED_QUEUE_SIZE", 10000)
 
 LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
 
@@ -8,6 +8,8 @@ from db_functions.db import get_summary_checkpoint_db, set_summary_checkpoint_db
 logger = logging.getLogger(__name__)
 
 _redis: Redis | None = None
+# версии сессий агента без Redis живут только в памяти процесса
+_session_versions: dict[str, int] = {}
 
 
 def _checkpoint_key(chat_id: int, thread_id: int | None) -> str:
@@ -15,6 +17,11 @@ def _checkpoint_key(chat_id: int, thread_id: int | None) -> str:
     return f"summary_checkpoint:{chat_id}:{thread_key}"
 
 
+def _session_key(chat_id: int, thread_id: int | None) -> str:
+    thread_key = int(thread_id or 0)
+    return f"agent_session_version:{chat_id}:{thread_key}"
+
+
 async def checkpoints_init():
     global _redis
     if not REDIS_URL:
@@ -29,6 +36,11 @@ async def checkpoints_init():
         _redis = None
 
 
+def get_redis() -> Redis | None:
+    """Shared Redis connection of the bot, None if Redis is not configured or unavailable."""
+    return _redis
+
+
 async def checkpoints_close():
     global _redis
     if _redis is not None:
@@ -68,3 +80,34 @@ async def set_last_checkpoint(chat_id: int, thread_id: int | None, message_id: i
             await _redis.set(key, str(message_id))
         except Exception as exc:
             logger.warning("Redis set failed: %s", exc)
+
+
+async def get_session_version(chat_id: int, thread_id: int | None) -> int | None:
+    key = _session_key(chat_id, thread_id)
+
+    if _redis is not None:
+        try:
+            cached = await _redis.get(key)
+            return int(cached) if cached is not None else None
+        except Exception as exc:
+            logger.warning("Redis get failed: %s", exc)
+
+    return _session_versions.get(key)
+
+
+async def set_session_version(chat_id: int, thread_id: int | None, version: int | None):
+    key = _session_key(chat_id, thread_id)
+
+    if version is None:
+        _session_versions.pop(key, None)
+    else:
+        _session_versions[key] = int(version)
+
+    if _redis is not None:
+        try:
+            if version is None:
+                await _redis.delete(key)
+            else:
+                await _redis.set(key, str(version))
+        except Exception as exc:
+            logger.warning("Redis set failed: %s", exc)
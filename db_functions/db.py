@@ -390,18 +390,19 @@ async def save_message(
 
 # db_functions/db.py
 
-async def update_message_text(chat_id: int, message_id: int, new_text: str):
+async def update_message_text(chat_id: int, message_id: int, new_text: str) -> dict | None:
     """
     Добавляет/обновляет распознанный текст у сообщения.
     Если text пустой — ставим new_text, иначе дописываем с новой строки.
+    Возвращает обновлённую строку (message_id, user_id, username, type, text) или None.
     """
     pool = _require_pool()
     clean = (new_text or "").strip()
     if not clean:
-        return
+        return None
 
     async with pool.acquire() as conn:
-        await conn.execute(
+        row = await conn.fetchrow(
             """
             UPDATE messages
             SET text = CASE
@@ -409,9 +410,11 @@ async def update_message_text(chat_id: int, message_id: int, new_text: str):
                 ELSE text || E'\n' || $3
             END
             WHERE chat_id=$1 AND message_id=$2
+            RETURNING message_id, user_id, username, type, text
             """,
             chat_id, message_id, clean
         )
+        return dict(row) if row else None
 
 
 if __name__ == "__main__":
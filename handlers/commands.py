@@ -1,4 +1,7 @@
+import json
 import logging
+import time
+from typing import Awaitable, Callable
 
 import httpx
 import asyncio
@@ -8,22 +11,49 @@ from aiogram.types import Message
 from aiogram.exceptions import TelegramBadRequest
 
 from config import (
-    AGENT_URL,
+    SUMMARY_AGENT_MODE,
+    SUMMARY_AGENT_SESSIONS,
     SUMMARY_AGENT_TIMEOUT_SECONDS,
+    SUMMARY_CLUSTERING,
+    SUMMARY_COALESCE,
+    SUMMARY_COALESCE_LOCK_SECONDS,
+    SUMMARY_COALESCE_RESULT_SECONDS,
     SUMMARY_CONTEXT_WINDOW_TOKENS,
+    SUMMARY_DEDUP,
+    SUMMARY_EXTRACTIVE,
+    SUMMARY_EXTRACTIVE_BUDGET_TOKENS,
+    SUMMARY_FUSED,
     SUMMARY_INCLUDE_NOISE,
+    SUMMARY_MAP_CONCURRENCY,
     SUMMARY_MAX_MESSAGES,
     SUMMARY_MIN_TOPIC_SIZE,
     SUMMARY_OLLAMA_MODEL,
+    SUMMARY_POLL_INTERVAL_SECONDS,
+    SUMMARY_THEME_CONCURRENCY,
+    SUMMARY_WINDOW_MERGE_THRESHOLD,
+    SUMMARY_WINDOW_SIZE,
+)
+from db_functions.checkpoints import (
+    get_last_checkpoint,
+    get_session_version,
+    set_last_checkpoint,
+    set_session_version,
 )
-from db_functions.checkpoints import get_last_checkpoint, set_last_checkpoint
 from db_functions.db import get_messages_after_id, get_summary_state_db, set_summary_state_db
+from utils.agent_client import agent_url, message_for_agent
+from utils.single_flight import SingleFlight
 
 router = Router()
 logger = logging.getLogger(__name__)
 
 TG_MESSAGE_LIMIT = 3900
 
+summarize_flight = SingleFlight(
+    prefix="summarize_flight",
+    lock_seconds=SUMMARY_COALESCE_LOCK_SECONDS,
+    result_seconds=SUMMARY_COALESCE_RESULT_SECONDS,
+)
+
 
 def split_tg_message(text: str, limit: int = TG_MESSAGE_LIMIT) -> list[str]:
     """
@@ -73,12 +103,9 @@ def split_tg_message(text: str, limit: int = TG_MESSAGE_LIMIT) -> list[str]:
 def _messages_for_agent(messages: list[dict]) -> list[dict]:
     out: list[dict] = []
     for msg in messages:
-        msg_type = msg.get("type") or "text"
-        text = (msg.get("text") or "").strip()
-        if not text:
-            continue
-        user = msg.get("username") or str(msg.get("user_id") or "user")
-        out.append({"user": user, "type": msg_type, "text": text})
+        item = message_for_agent(msg)
+        if item is not None:
+            out.append(item)
     return out
 
 
@@ -111,13 +138,136 @@ def _summary_state_from_result(result: dict) -> dict[str, str]:
     return state
 
 
+async def _post_analyze(
+        client: httpx.AsyncClient,
+        path: str,
+        payload: dict,
+) -> tuple[dict | None, int | None]:
+    """
+    POST to the agent; returns (result, session version from X-Session-Version).
+    (None, None) means 409: the agent session is gone or stale.
+    """
+    resp = await client.post(agent_url(path), json=payload)
+    if resp.status_code == 409:
+        return None, None
+    resp.raise_for_status()
+    version = resp.headers.get("X-Session-Version")
+    return resp.json(), int(version) if version else None
+
+
+_STAGE_TITLES = {
+    "queued": "в очереди",
+    "embedding": "эмбеддинги",
+    "clustering": "поиск тем",
+    "summarizing": "суммаризация тем",
+}
+
+
+def _progress_text(job: dict) -> str:
+    stage = _STAGE_TITLES.get(job.get("stage"), job.get("stage") or "")
+    total = job.get("total") or 0
+    if total > 1:
+        return f"⏳ {stage}: {job.get('done', 0)}/{total}"
+    return f"⏳ {stage}…"
+
+
+async def _poll_job(
+        client: httpx.AsyncClient,
+        payload: dict,
+        on_progress: Callable[[str], Awaitable[None]],
+) -> tuple[dict | None, int | None]:
+    """
+    Submit the request as an agent job and poll it until it finishes.
+    Same contract as _post_analyze: (None, None) when the agent session is stale.
+    """
+    resp = await client.post(agent_url("/jobs"), json=payload)
+    resp.raise_for_status()
+    job_id = resp.json()["id"]
+
+    deadline = time.monotonic() + SUMMARY_AGENT_TIMEOUT_SECONDS if SUMMARY_AGENT_TIMEOUT_SECONDS > 0 else None
+    last_text = None
+    while True:
+        await asyncio.sleep(max(1, SUMMARY_POLL_INTERVAL_SECONDS))
+        resp = await client.get(agent_url(f"/jobs/{job_id}"))
+        resp.raise_for_status()
+        job = resp.json()
+
+        if job["status"] == "done":
+            return job["result"], job.get("session_version")
+        if job["status"] in ("failed", "cancelled"):
+            if job.get("status_code") == 409:
+                return None, None
+            raise RuntimeError(f"agent job {job_id} {job['status']}: {job.get('error')}")
+
+        text = _progress_text(job)
+        if text != last_text:
+            await on_progress(text)
+            last_text = text
+        if deadline is not None and time.monotonic() > deadline:
+            # nobody will read the result any more: free the agent's worker
+            try:
+                await client.delete(agent_url(f"/jobs/{job_id}"))
+            except httpx.HTTPError as exc:
+                logger.warning("Failed to cancel agent job %s: %s", job_id, exc)
+            raise TimeoutError(f"agent job {job_id} is still {job['status']} after {SUMMARY_AGENT_TIMEOUT_SECONDS}s")
+
+
+async def _stream_analyze(
+        client: httpx.AsyncClient,
+        payload: dict,
+        on_progress: Callable[[str], Awaitable[None]],
+        on_theme: Callable[[str, str], Awaitable[None]],
+) -> tuple[dict | None, int | None]:
+    """
+    Read /analyze/stream (NDJSON) and hand over every finished theme right away.
+    Same contract as _post_analyze: (None, None) when the agent session is stale.
+    """
+    last_text = None
+    async with client.stream("POST", agent_url("/analyze/stream"), json=payload) as resp:
+        resp.raise_for_status()
+        async for line in resp.aiter_lines():
+            if not line.strip():
+                continue
+            event = json.loads(line)
+            kind = event.get("event")
+            if kind == "theme":
+                await on_theme(event.get("theme") or "", event.get("summary") or "")
+            elif kind == "progress":
+                text = _progress_text(event)
+                if text != last_text:
+                    await on_progress(text)
+                    last_text = text
+            elif kind == "done":
+                return event.get("result") or {}, event.get("session_version")
+            elif kind == "error":
+                if event.get("status_code") == 409:
+                    return None, None
+                raise RuntimeError(f"agent stream failed: {event.get('error')}")
+    raise RuntimeError("agent stream ended without a result")
+
+
+async def _run_analyze(
+        client: httpx.AsyncClient,
+        payload: dict,
+        on_progress: Callable[[str], Awaitable[None]],
+        on_theme: Callable[[str, str], Awaitable[None]],
+) -> tuple[dict | None, int | None]:
+    """A payload with session_version is a delta request."""
+    if SUMMARY_AGENT_MODE == "stream":
+        return await _stream_analyze(client, payload, on_progress, on_theme)
+    if SUMMARY_AGENT_MODE == "jobs":
+        return await _poll_job(client, payload, on_progress)
+    path = "/analyze/delta" if "session_version" in payload else "/analyze"
+    return await _post_analyze(client, path, payload)
+
+
 @router.message(Command("summarize"))
 async def summarize(message: Message):
     chat_id = message.chat.id
     thread_id = message.message_thread_id
     current_message_id = message.message_id
 
-    await message.answer("⏳ Собираю и анализирую сообщения, подожди…")
+    status_message = await message.answer("⏳ Собираю и анализирую сообщения, подожди…")
     await message.chat.do("typing")
 
     checkpoint = await get_last_checkpoint(chat_id=chat_id, thread_id=thread_id)
@@ -153,35 +303,134 @@ async def summarize(message: Message):
         await message.answer("Новых текстовых сообщений для суммаризации не найдено.")
         return
 
-    previous_summary = await get_summary_state_db(chat_id=chat_id, thread_id=thread_id)
+    if not SUMMARY_COALESCE:
+        await _summarize_with_agent(message, status_message, agent_messages, last_message_id)
+        return
+
+    # several /summarize over the same range: one pipeline, the others wait for it
+    flight_key = f"{chat_id}:{int(thread_id or 0)}:{checkpoint or 0}:{last_message_id}"
+    result, leader = await summarize_flight.run(
+        flight_key,
+        lambda: _summarize_with_agent(message, status_message, agent_messages, last_message_id),
+    )
+    if leader:
+        return
+
+    logger.info("Summarize coalesced chat_id=%s thread_id=%s key=%s", chat_id, thread_id, flight_key)
+    if result is not None:
+        text = "☝️ Сводка по этим сообщениям отправлена выше."
+    else:
+        text = "Ошибка при обращении к агенту. Попробуй позже."
+    try:
+        await status_message.edit_text(text)
+    except TelegramBadRequest:
+        await message.answer(text)
+
+
+async def _summarize_with_agent(
+        message: Message,
+        status_message: Message,
+        agent_messages: list[dict],
+        last_message_id: int,
+) -> dict | None:
+    """
+    Run the agent over `agent_messages`, post the summary and advance checkpoint/state.
+    Returns the agent result, or None if the request failed (the user is already told).
+    """
+    chat_id = message.chat.id
+    thread_id = message.message_thread_id
 
     payload = {
         "messages": agent_messages,
         "min_topic_size": SUMMARY_MIN_TOPIC_SIZE,
         "include_noise": SUMMARY_INCLUDE_NOISE,
+        "clustering": SUMMARY_CLUSTERING,
+        "dedup": SUMMARY_DEDUP,
+        "window_size": max(0, SUMMARY_WINDOW_SIZE),
+        "window_merge_threshold": min(1.0, max(0.01, SUMMARY_WINDOW_MERGE_THRESHOLD)),
         "ollama_model": SUMMARY_OLLAMA_MODEL,
         "context_window_tokens": SUMMARY_CONTEXT_WINDOW_TOKENS,
+        "theme_concurrency": max(1, SUMMARY_THEME_CONCURRENCY),
+        "map_concurrency": max(1, SUMMARY_MAP_CONCURRENCY),
+        "fused": SUMMARY_FUSED,
+        "extractive": SUMMARY_EXTRACTIVE,
     }
-    if previous_summary:
-        payload["previous_summary"] = previous_summary
+    if SUMMARY_EXTRACTIVE_BUDGET_TOKENS > 0:
+        payload["extractive_budget_tokens"] = SUMMARY_EXTRACTIVE_BUDGET_TOKENS
+    if SUMMARY_AGENT_SESSIONS:
+        payload["chat_id"] = chat_id
+        payload["thread_id"] = thread_id
 
-    base_url = AGENT_URL.rstrip("/")
-    url = base_url if base_url.endswith("/analyze") else f"{base_url}/analyze"
+    async def on_progress(text: str) -> None:
+        try:
+            await status_message.edit_text(text)
+        except TelegramBadRequest:
+            pass
 
+    sent_themes: set[str] = set()
+
+    async def send_text(text: str) -> None:
+        if not sent_themes:
+            text = f"📄 Суммаризация:\n\n{text}"
+        for chunk in split_tg_message(text):
+            try:
+                await message.answer(chunk)
+            except TelegramBadRequest:
+                await message.answer(chunk[:TG_MESSAGE_LIMIT])
+
+    async def on_theme(theme: str, summary: str) -> None:
+        await send_text(_format_summary({theme: {"theme": theme, "summary": summary}}))
+        sent_themes.add(theme)
+
+    previous_summary = None
     try:
         timeout = None
-        if SUMMARY_AGENT_TIMEOUT_SECONDS > 0:
+        if SUMMARY_AGENT_MODE == "jobs":
+            # every HTTP call is short; SUMMARY_AGENT_TIMEOUT_SECONDS bounds the whole poll instead
+            timeout = httpx.Timeout(30)
+        elif SUMMARY_AGENT_TIMEOUT_SECONDS > 0:
             timeout = httpx.Timeout(SUMMARY_AGENT_TIMEOUT_SECONDS)
         async with httpx.AsyncClient(timeout=timeout) as client:
-            resp = await client.post(url, json=payload)
-            resp.raise_for_status()
-            result = resp.json()
+            result, session_version = None, None
+            known_version = await get_session_version(chat_id, thread_id) if SUMMARY_AGENT_SESSIONS else None
+            if known_version is not None:
+                # агент помнит прошлые сводки — отправляем только новые сообщения
+                result, session_version = await _run_analyze(
+                    client,
+                    {**payload, "session_version": known_version},
+                    on_progress,
+                    on_theme,
+                )
+                if result is None and sent_themes:
+                    # a full rerun would post the already sent themes a second time
+                    raise RuntimeError("agent session conflict after themes were sent")
+                if result is None:
+                    logger.info("Agent session is stale chat_id=%s thread_id=%s; sending full request", chat_id, thread_id)
+
+            if result is None:
+                previous_summary = await get_summary_state_db(chat_id=chat_id, thread_id=thread_id)
+                if previous_summary:
+                    payload["previous_summary"] = previous_summary
+                result, session_version = await _run_analyze(client, payload, on_progress, on_theme)
+                if result is None:
+                    raise RuntimeError("agent rejected a full /analyze request")
+    except httpx.HTTPStatusError as exc:
+        if exc.response.status_code != 429:
+            logger.exception("Agent request failed: %s", exc)
+            await message.answer("Ошибка при обращении к агенту. Попробуй позже.")
+            return None
+        retry_after = exc.response.headers.get("Retry-After", "60")
+        logger.warning("Agent is busy chat_id=%s thread_id=%s retry_after=%s", chat_id, thread_id, retry_after)
+        await message.answer(f"Агент сейчас занят другими запросами. Попробуй через {retry_after} с.")
+        return None
     except Exception as exc:
         logger.exception("Agent request failed: %s", exc)
         await message.answer("Ошибка при обращении к агенту. Попробуй позже.")
-        return
+        return None
+
+    if SUMMARY_AGENT_SESSIONS:
+        await set_session_version(chat_id, thread_id, session_version)
 
-    summary_text = _format_summary(result)
     summary_state = _summary_state_from_result(result)
     if not summary_state and previous_summary:
         summary_state = previous_summary
@@ -191,13 +440,16 @@ async def summarize(message: Message):
 
     logger.info("Checkpoint updated chat_id=%s thread_id=%s message_id=%s", chat_id, thread_id, last_message_id)
 
-    full_text = f"📄 Суммаризация:\n\n{summary_text}"
+    # in stream mode most themes are already sent; the rest are previous themes carried over
+    rest = {
+        key: item
+        for key, item in result.items()
+        if not (isinstance(item, dict) and (item.get("theme") or key) in sent_themes)
+    }
+    if rest or not sent_themes:
+        await send_text(_format_summary(rest))
+    return result
 
-    for chunk in split_tg_message(full_text):
-        try:
-            await message.answer(chunk)
-        except TelegramBadRequest:
-            await message.answer(chunk[:TG_MESSAGE_LIMIT])
 
 @router.message(Command("help"))
 async def help_handler(message: Message):
@@ -11,6 +11,7 @@ import httpx
 
 from config import PHOTO_SERVICE_URL, SPEECH_SERVICE_URL, MEDIA_TIMEOUT_SECONDS, TESS_LANG
 from db_functions.db import save_message, update_message_text
+from utils.embed_queue import enqueue_for_embedding
 
 router = Router()
 logger = logging.getLogger(__name__)
@@ -38,14 +39,18 @@ async def _process_media(chat_id: int, message_id: int, msg_type: str, file_path
             data = await _post_file(url, "image", file_path, MEDIA_TIMEOUT_SECONDS)
             text = (data.get("text") or "").strip()
             if text:
-                await update_message_text(chat_id, message_id, f"[OCR {data.get('lang','')}]\n{text}")
+                row = await update_message_text(chat_id, message_id, f"[OCR {data.get('lang','')}]\n{text}")
+                if row:
+                    enqueue_for_embedding(row)
 
         elif msg_type in ("voice", "video_note", "video") and SPEECH_SERVICE_URL:
             url = SPEECH_SERVICE_URL.rstrip("/") + "/v1/transcribe"
             data = await _post_file(url, "audio", file_path, MEDIA_TIMEOUT_SECONDS)
             text = (data.get("text") or "").strip()
             if text:
-                await update_message_text(chat_id, message_id, f"[ASR]\n{text}")
+                row = await update_message_text(chat_id, message_id, f"[ASR]\n{text}")
+                if row:
+                    enqueue_for_embedding(row)
 
     except Exception:
         logger.exception("Media processing failed chat_id=%s message_id=%s type=%s", chat_id, message_id, msg_type)
@@ -102,7 +107,15 @@ async def save_to_db(message: Message):
             file_path=file_path,
             created_at=message.date
         )
-            # После сохранения — распознаём медиа в фоне и дописываем text в БД
+        if text:
+            enqueue_for_embedding({
+                "message_id": message.message_id,
+                "user_id": message.from_user.id if message.from_user else None,
+                "username": message.from_user.username if message.from_user else None,
+                "type": msg_type,
+                "text": text,
+            })
+        # После сохранения — распознаём медиа в фоне и дописываем text в БД
         if file_path and msg_type in ("photo", "voice", "video_note", "video"):
             asyncio.create_task(_process_media(message.chat.id, message.message_id, msg_type, file_path))
 
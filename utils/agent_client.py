@@ -0,0 +1,27 @@
+from config import AGENT_URL
+
+
+def agent_url(path: str) -> str:
+    """
+    Full URL of an agent endpoint.
+
+    AGENT_URL may be given either as the service root or (historically) as the
+    /analyze endpoint itself.
+    """
+    base = AGENT_URL.rstrip("/")
+    if base.endswith("/analyze"):
+        base = base[: -len("/analyze")]
+    return f"{base}{path}"
+
+
+def message_for_agent(msg: dict) -> dict | None:
+    """
+    Convert a `messages` table row into the agent's MessageIn payload.
+    Returns None for messages without text.
+    """
+    msg_type = msg.get("type") or "text"
+    text = (msg.get("text") or "").strip()
+    if not text:
+        return None
+    user = msg.get("username") or str(msg.get("user_id") or "user")
+    return {"id": msg.get("message_id"), "user": user, "type": msg_type, "text": text}
@@ -0,0 +1,58 @@
+import asyncio
+import logging
+
+import httpx
+
+from config import EMBED_AT_INGEST, EMBED_BATCH_SIZE, EMBED_FLUSH_SECONDS, EMBED_QUEUE_SIZE
+from utils.agent_client import agent_url, message_for_agent
+
+logger = logging.getLogger(__name__)
+
+_queue: asyncio.Queue = asyncio.Queue(maxsize=max(1, EMBED_QUEUE_SIZE))
+
+
+def enqueue_for_embedding(msg: dict) -> None:
+    """
+    Schedule a saved message for background embedding on the agent.
+
+    Never blocks the handler: if the queue is full the message is dropped and will
+    simply be embedded at /summarize time instead.
+    """
+    if not EMBED_AT_INGEST:
+        return
+    payload = message_for_agent(msg)
+    if payload is None:
+        return
+    try:
+        _queue.put_nowait(payload)
+    except asyncio.QueueFull:
+        logger.debug("Embed queue full, dropping message_id=%s", payload.get("id"))
+
+
+async def embed_worker():
+    """
+    Drain the queue in micro-batches: wait for the first message, then collect more
+    for up to EMBED_FLUSH_SECONDS or EMBED_BATCH_SIZE messages, and POST them to /embed.
+    """
+    url = agent_url("/embed")
+    loop = asyncio.get_running_loop()
+
+    async with httpx.AsyncClient(timeout=httpx.Timeout(60)) as client:
+        while True:
+            batch = [await _queue.get()]
+            deadline = loop.time() + EMBED_FLUSH_SECONDS
+            while len(batch) < EMBED_BATCH_SIZE:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(_queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            try:
+                resp = await client.post(url, json={"messages": batch})
+                resp.raise_for_status()
+                logger.debug("Embedded at ingest: %s messages", len(batch))
+            except Exception as exc:
+                logger.warning("Ingest embedding failed for %s messages: %s", len(batch), exc)
@@ -0,0 +1,106 @@
+import asyncio
+import json
+import logging
+import time
+import uuid
+from typing import Any, Awaitable, Callable
+
+from db_functions.checkpoints import get_redis
+
+logger = logging.getLogger(__name__)
+
+# delete the lock only if it is still ours (it may have expired and been taken over)
+_RELEASE_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key into one execution.
+
+    Within the process followers await the leader's future. Across bot replicas the
+    leader holds a Redis lock (SET NX PX) and publishes its JSON result under a
+    result key; followers on other replicas poll for that result. Without Redis
+    only in-process coalescing is done.
+
+    `run` returns (result, is_leader). A leader that fails (raises or returns None)
+    publishes nothing, so a follower on another replica takes over once the lock
+    is released.
+    """
+
+    def __init__(
+            self,
+            prefix: str,
+            lock_seconds: int = 900,
+            result_seconds: int = 300,
+            poll_seconds: float = 1.0,
+    ):
+        self.prefix = prefix
+        self.lock_seconds = max(1, int(lock_seconds))
+        self.result_seconds = max(1, int(result_seconds))
+        self.poll_seconds = poll_seconds
+        self._inflight: dict[str, asyncio.Future] = {}
+
+    async def run(self, key: str, fn: Callable[[], Awaitable[Any]]) -> tuple[Any, bool]:
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            return await asyncio.shield(inflight), False
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            result, leader = await self._run_shared(key, fn)
+            future.set_result(result)
+            return result, leader
+        except Exception as exc:
+            future.set_exception(exc)
+            future.exception()  # followers re-raise it; don't warn if there are none
+            raise
+        finally:
+            self._inflight.pop(key, None)
+            if not future.done():
+                future.cancel()
+
+    async def _run_shared(self, key: str, fn: Callable[[], Awaitable[Any]]) -> tuple[Any, bool]:
+        redis = get_redis()
+        if redis is None:
+            return await fn(), True
+
+        lock_key = f"{self.prefix}:lock:{key}"
+        result_key = f"{self.prefix}:result:{key}"
+        token = uuid.uuid4().hex
+        deadline = time.monotonic() + self.lock_seconds
+
+        try:
+            while True:
+                cached = await redis.get(result_key)
+                if cached is not None:
+                    return json.loads(cached), False
+                if await redis.set(lock_key, token, nx=True, px=self.lock_seconds * 1000):
+                    break
+                if time.monotonic() > deadline:
+                    raise TimeoutError(f"single-flight leader for {key} did not finish in {self.lock_seconds}s")
+                await asyncio.sleep(self.poll_seconds)
+        except TimeoutError:
+            raise
+        except Exception as exc:
+            logger.warning("Redis single-flight unavailable, running locally: %s", exc)
+            return await fn(), True
+
+        try:
+            result = await fn()
+            if result is not None:
+                try:
+                    await redis.set(result_key, json.dumps(result, ensure_ascii=False), ex=self.result_seconds)
+                except Exception as exc:
+                    logger.warning("Redis set failed: %s", exc)
+            return result, True
+        finally:
+            try:
+                await redis.eval(_RELEASE_SCRIPT, 1, lock_key, token)
+            except Exception as exc:
+                logger.warning("Redis lock release failed: %s", exc)